@@ -0,0 +1,55 @@
+"""Compare bulk step metrics against per-step dict processing.
+
+Run from the repository root with ``python -m benchmarks.bench_step_metrics``.
+"""
+from __future__ import print_function
+import random
+import timeit
+from datetime import datetime, timedelta
+
+import pytz
+
+from emr.job_client import cluster_step_metrics
+from emr.metrics import bulk_step_metrics
+
+STATES = ['PENDING', 'RUNNING', 'COMPLETED', 'CANCELLED', 'FAILED']
+
+
+def generate_steps(count, names=50):
+    start = datetime(2018, 1, 1).replace(tzinfo=pytz.utc)
+    return [{
+        'Id': 's-{}'.format(i),
+        'Name': 'Job{}'.format(random.randrange(names)),
+        'Status': {
+            'State': random.choice(STATES),
+            'Timeline': {'CreationDateTime': start + timedelta(minutes=i)}
+        }
+    } for i in range(count)]
+
+
+def per_step(steps):
+    metrics = [cluster_step_metrics(s) for s in steps]
+    counts, newest = {}, {}
+    for step, m in zip(steps, metrics):
+        counts[m['state']] = counts.get(m['state'], 0) + 1
+        created = step['Status']['Timeline']['CreationDateTime']
+        if m['name'] not in newest or created > newest[m['name']][0]:
+            newest[m['name']] = (created, m)
+    return metrics, counts, newest
+
+
+def main():
+    for count in (1000, 10000, 50000):
+        steps = generate_steps(count)
+        runs = max(1, 100000 // count)
+        baseline = min(timeit.repeat(lambda: per_step(steps),
+                                     number=runs, repeat=3)) / runs
+        bulk = min(timeit.repeat(lambda: bulk_step_metrics(steps),
+                                 number=runs, repeat=3)) / runs
+        print('steps={:>6}  per-step={:8.2f}ms  bulk={:8.2f}ms  '
+              'speedup={:.1f}x'.format(count, baseline * 1000, bulk * 1000,
+                                       baseline / bulk))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,337 @@
+import contextlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+# default directory of the admission queues shared by processes on the host
+ADMISSION_DIR = os.path.join(tempfile.gettempdir(), 'emr-admission')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS queue (
+    id TEXT PRIMARY KEY,
+    priority INTEGER NOT NULL,
+    queued REAL NOT NULL,
+    heartbeat REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS admitted (
+    id TEXT PRIMARY KEY,
+    admitted REAL NOT NULL,
+    submitted REAL
+);
+CREATE TABLE IF NOT EXISTS listing (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    refreshed REAL,
+    refreshing REAL,
+    active INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO listing VALUES (0, NULL, NULL, 0);
+'''
+
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+
+class Admission(object):
+    """A granted slot to submit one step to a cluster.
+
+    Used as a context manager around the submission: leaving the block
+    normally marks the step as submitted, and leaving it with an exception
+    releases the slot.
+
+    Attributes:
+        priority (int): Priority the submission was queued with.
+        queued_at (float): Time the submission was queued.
+        admitted_at (float): Time the slot was granted, or None.
+        submitted_at (float): Time the step was submitted, or None.
+    """
+    def __init__(self, controller, priority):
+        self.id = uuid.uuid4().hex
+        self.priority = priority
+        self.queued_at = time.time()
+        self.admitted_at = None
+        self.submitted_at = None
+        self._controller = controller
+
+    @property
+    def wait_seconds(self):
+        """float: Seconds spent queued before the slot was granted."""
+        return (self.admitted_at or time.time()) - self.queued_at
+
+    def submitted(self):
+        """Mark the step as submitted, so it is counted from the listing."""
+        self._controller._submitted(self)
+
+    def release(self):
+        """Give up the slot without submitting a step."""
+        self._controller._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.submitted()
+        else:
+            self.release()
+
+
+class AdmissionController(object):
+    """Client-side limit on in-flight steps per cluster.
+
+    Submissions wait in a priority queue until the number of PENDING and
+    RUNNING steps on the cluster, plus the steps admitted but not yet
+    visible in a listing, drops below the limit. The queue, the admitted
+    steps and the latest listing are kept in one SQLite file per cluster in
+    a shared directory, so every process (and thread) on the host
+    submitting to the cluster waits in the same queue.
+
+    The active step listing bypasses any shared step cache, is refreshed at
+    most once per refresh interval, only while a submission is waiting, and
+    without holding the file's write lock.
+
+    Attributes:
+        aws_api (emr.utils.AWSApi): Client used to list active steps.
+        cluster_id (str): The ID of the EMR cluster.
+        max_active_steps (int): Limit of in-flight steps on the cluster.
+        refresh_interval (float): Minimum seconds between step listings.
+        directory (str): Directory holding the admission files.
+        poll_interval (float): Seconds between checks of a waiting
+            submission.
+        lock_timeout (float): Seconds to wait for the file's write lock.
+            Queued submissions that have not checked in for this long, and
+            admitted ones not submitted within it, are assumed dead.
+
+    Example:
+        >>> controller = AdmissionController(AWSApi(), 'j-2MTD0ERMUNR2A', 4)
+        >>> with controller.admit(priority=10):
+        ...     run_shell_command(cli_cmd)
+    """
+    def __init__(self, aws_api, cluster_id, max_active_steps,
+                 refresh_interval=30, directory=None, poll_interval=1,
+                 lock_timeout=120):
+        self.aws_api = aws_api
+        self.cluster_id = cluster_id
+        self.max_active_steps = max_active_steps
+        self.refresh_interval = refresh_interval
+        self.directory = directory or ADMISSION_DIR
+        self.poll_interval = poll_interval
+        self.lock_timeout = lock_timeout
+        self._stats_lock = threading.Lock()
+        self._admitted = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        os.makedirs(self.directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def admit(self, priority=0):
+        """Wait for a slot to submit a step.
+
+        Higher priorities are admitted first; equal priorities are admitted
+        in the order they were queued.
+
+        Args:
+            priority (int): Priority of the submission. Defaults to 0.
+
+        Returns:
+            Admission: The granted slot.
+
+        Raises:
+            botocore.exceptions.ClientError: If listing the active steps
+                fails. The submission is removed from the queue.
+        """
+        admission = Admission(self, priority)
+        with self._connect() as conn:
+            with self._transaction(conn):
+                conn.execute('INSERT INTO queue VALUES (?, ?, ?, ?)', (
+                    admission.id, priority, admission.queued_at,
+                    admission.queued_at))
+            try:
+                while not self._try_admit(conn, admission):
+                    time.sleep(self.poll_interval)
+            except BaseException:
+                with self._transaction(conn):
+                    conn.execute('DELETE FROM queue WHERE id = ?',
+                                 (admission.id,))
+                raise
+
+        with self._stats_lock:
+            self._admitted += 1
+            self._total_wait += admission.wait_seconds
+            self._max_wait = max(self._max_wait, admission.wait_seconds)
+        return admission
+
+    def queue_depth(self):
+        """Get the number of submissions waiting for a slot.
+
+        Returns:
+            int: Number of queued submissions, across processes.
+        """
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM queue').fetchone()[0]
+
+    def stats(self):
+        """Get queue and wait time statistics.
+
+        Returns:
+            dict: A dictionary with keys 'queueDepth', 'inFlight' and
+                'maxActiveSteps' across processes, and 'admitted',
+                'meanWaitSeconds' and 'maxWaitSeconds' for this process.
+        """
+        with self._connect() as conn:
+            queue_depth = \
+                conn.execute('SELECT COUNT(*) FROM queue').fetchone()[0]
+            in_flight = self._in_flight(conn)
+        with self._stats_lock:
+            return {
+                'queueDepth': queue_depth,
+                'inFlight': in_flight,
+                'maxActiveSteps': self.max_active_steps,
+                'admitted': self._admitted,
+                'meanWaitSeconds':
+                    self._total_wait / self._admitted if self._admitted
+                    else 0.0,
+                'maxWaitSeconds': self._max_wait
+            }
+
+    def _try_admit(self, conn, admission):
+        with self._transaction(conn):
+            self._expire(conn)
+            conn.execute('UPDATE queue SET heartbeat = ? WHERE id = ?',
+                         (time.time(), admission.id))
+            if not self._is_next(conn, admission):
+                return False
+            list_start = self._claim_refresh(conn)
+
+        if list_start is not None:
+            self._refresh(conn, list_start)
+
+        with self._transaction(conn):
+            if not self._is_next(conn, admission) or \
+                    self._in_flight(conn) >= self.max_active_steps:
+                return False
+            admission.admitted_at = time.time()
+            conn.execute('DELETE FROM queue WHERE id = ?', (admission.id,))
+            conn.execute('INSERT INTO admitted VALUES (?, ?, NULL)',
+                         (admission.id, admission.admitted_at))
+        return True
+
+    def _claim_refresh(self, conn):
+        # called in a transaction; returns the listing start time if this
+        # submission should refresh the listing
+        now = time.time()
+        refreshed, refreshing = conn.execute(
+            'SELECT refreshed, refreshing FROM listing').fetchone()
+        fresh = refreshed is not None and \
+            now - refreshed < self.refresh_interval
+        claimed = refreshing is not None and \
+            now - refreshing < self.lock_timeout
+        if fresh or claimed:
+            return None
+        conn.execute('UPDATE listing SET refreshing = ?', (now,))
+        return now
+
+    def _refresh(self, conn, list_start):
+        try:
+            steps = self.aws_api.list_cluster_steps(
+                self.cluster_id, active_only=True, use_cache=False)
+        except BaseException:
+            with self._transaction(conn):
+                conn.execute('UPDATE listing SET refreshing = NULL')
+            raise
+
+        with self._transaction(conn):
+            conn.execute(
+                'UPDATE listing SET refreshed = ?, refreshing = NULL, '
+                'active = ?', (list_start, len(steps)))
+            # steps submitted before this listing started are counted in it
+            conn.execute('DELETE FROM admitted WHERE submitted < ?',
+                         (list_start,))
+            unseen = self._unseen(conn)
+        logging.debug('clusterId={}, action=refresh-active-steps, '
+                      'activeSteps={}, unseenSteps={}'.format(
+                          self.cluster_id, len(steps), unseen))
+
+    def _expire(self, conn):
+        expired = time.time() - self.lock_timeout
+        conn.execute('DELETE FROM queue WHERE heartbeat < ?', (expired,))
+        conn.execute('DELETE FROM admitted WHERE submitted IS NULL AND '
+                     'admitted < ?', (expired,))
+
+    def _is_next(self, conn, admission):
+        row = conn.execute('SELECT id FROM queue ORDER BY priority DESC, '
+                           'queued, id LIMIT 1').fetchone()
+        return row is not None and row[0] == admission.id
+
+    def _unseen(self, conn):
+        return conn.execute('SELECT COUNT(*) FROM admitted').fetchone()[0]
+
+    def _in_flight(self, conn):
+        active = conn.execute('SELECT active FROM listing').fetchone()[0]
+        return active + self._unseen(conn)
+
+    def _submitted(self, admission):
+        admission.submitted_at = time.time()
+        with self._connect() as conn:
+            with self._transaction(conn):
+                conn.execute('UPDATE admitted SET submitted = ? WHERE id = ?',
+                             (admission.submitted_at, admission.id))
+
+    def _release(self, admission):
+        with self._connect() as conn:
+            with self._transaction(conn):
+                conn.execute('DELETE FROM admitted WHERE id = ?',
+                             (admission.id,))
+
+    @contextlib.contextmanager
+    def _connect(self):
+        path = os.path.join(self.directory, '{}.db'.format(self.cluster_id))
+        conn = sqlite3.connect(path, timeout=self.lock_timeout,
+                               isolation_level=None)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            yield conn
+        finally:
+            conn.close()
+
+    @contextlib.contextmanager
+    def _transaction(self, conn):
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+
+def get_controller(aws_api, cluster_id, max_active_steps, directory=None):
+    """Get the admission controller for a cluster.
+
+    Concurrent job requests in the same process share one controller per
+    cluster and directory; processes share its queue through the directory.
+
+    Args:
+        aws_api (emr.utils.AWSApi): Client used to list active steps when
+            the controller is created.
+        cluster_id (str): The ID of the EMR cluster.
+        max_active_steps (int): Limit of in-flight steps on the cluster.
+        directory (str): Optional directory of the shared admission files.
+            Defaults to ADMISSION_DIR.
+
+    Returns:
+        AdmissionController: The cluster's controller.
+    """
+    key = (directory or ADMISSION_DIR, cluster_id)
+    with _controllers_lock:
+        controller = _controllers.get(key)
+        if controller is None:
+            controller = AdmissionController(
+                aws_api, cluster_id, max_active_steps, directory=directory)
+            _controllers[key] = controller
+        controller.max_active_steps = max_active_steps
+        return controller
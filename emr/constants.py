@@ -12,3 +12,44 @@ EXTRACT_KEYS = [
     'terminate',
     'dryrun'
 ]
+
+ACTIVE_STEP_STATES = ['PENDING', 'RUNNING']
+
+ALL_STEP_STATES = [
+    'PENDING',
+    'CANCEL_PENDING',
+    'RUNNING',
+    'COMPLETED',
+    'CANCELLED',
+    'FAILED',
+    'INTERRUPTED'
+]
+
+TERMINAL_STEP_STATES = ['COMPLETED', 'CANCELLED', 'FAILED', 'INTERRUPTED']
+
+NON_TERMINAL_STEP_STATES = ['PENDING', 'CANCEL_PENDING', 'RUNNING']
+
+SPEC_KEYS = [
+    'profile',
+    'job_runtime',
+    'job_timeout',
+    'artifact_path',
+    'poll_cluster',
+    'terminate',
+    'job_args',
+    'job_configs',
+    'main_class',
+    'history_db',
+    'status_port',
+    'shared_step_cache',
+    'step_cache_ttl',
+    'max_active_steps',
+    'priority',
+    'admission_dir',
+    'yarn_progress',
+    'retry_states',
+    'max_attempts',
+    'retry_backoff'
+]
+
+FAILED_STEP_STATES = ['CANCELLED', 'FAILED', 'INTERRUPTED']
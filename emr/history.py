@@ -0,0 +1,267 @@
+from __future__ import print_function
+import click
+import json
+import logging
+import logging.config
+import math
+import sqlite3
+
+import emr.utils
+from emr.constants import TERMINAL_STEP_STATES
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS steps (
+    step_id TEXT PRIMARY KEY,
+    cluster_id TEXT NOT NULL,
+    cluster_name TEXT NOT NULL,
+    job_name TEXT NOT NULL,
+    created REAL NOT NULL,
+    started REAL NOT NULL,
+    ended REAL NOT NULL,
+    duration REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS steps_by_job
+    ON steps (job_name, cluster_name, duration);
+CREATE TABLE IF NOT EXISTS sync_marks (
+    cluster_id TEXT PRIMARY KEY,
+    resume_from REAL NOT NULL
+);
+'''
+
+
+class StepHistory(object):
+    """Local SQLite store of completed EMR step timelines.
+
+    Steps are keyed by step id and indexed by job name and cluster name, so
+    runtime percentiles for a job can be answered without calling EMR.
+
+    Attributes:
+        db_path (str): Path of the SQLite database file.
+        conn (sqlite3.Connection): Open database connection.
+
+    Example:
+        >>> history = StepHistory('steps.db')
+        >>> history.sync(AWSApi(), 'j-2MTD0ERMUNR2A', 'Sandbox')
+        >>> history.percentiles('WordCount', 'Sandbox')
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        """Close the underlying database connection."""
+        self.conn.close()
+
+    def record(self, cluster_id, cluster_name, step_info):
+        """Store the timeline of a single step if it has completed.
+
+        Args:
+            cluster_id (str): The ID of the EMR cluster.
+            cluster_name (str): The name of the EMR cluster.
+            step_info (dict): Step dictionary from the EMR ListSteps API.
+
+        Returns:
+            bool: True if a new step timeline was stored, False otherwise.
+        """
+        timeline = step_info['Status']['Timeline']
+        if step_info['Status']['State'] != 'COMPLETED' or \
+                'StartDateTime' not in timeline or \
+                'EndDateTime' not in timeline:
+            return False
+
+        started = emr.utils.to_epoch_seconds(timeline['StartDateTime'])
+        ended = emr.utils.to_epoch_seconds(timeline['EndDateTime'])
+        with self.conn:
+            cursor = self.conn.execute(
+                'INSERT OR IGNORE INTO steps VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (step_info['Id'], cluster_id, cluster_name, step_info['Name'],
+                 emr.utils.to_epoch_seconds(timeline['CreationDateTime']),
+                 started, ended, ended - started))
+        return cursor.rowcount == 1
+
+    def sync(self, aws_api, cluster_id, cluster_name):
+        """Incrementally store newly completed steps for a cluster.
+
+        ListSteps returns steps newest first, so paging stops as soon as it
+        reaches steps that were created before the resume mark of the last
+        sync. The resume mark is the creation time of the oldest step that
+        was still active during that sync, or of the newest step if none
+        were, which guarantees steps that completed since are revisited.
+
+        Args:
+            aws_api (emr.utils.AWSApi): Client used to list cluster steps.
+            cluster_id (str): The ID of the EMR cluster.
+            cluster_name (str): The name of the EMR cluster.
+
+        Returns:
+            int: Number of new step timelines stored.
+        """
+        row = self.conn.execute(
+            'SELECT resume_from FROM sync_marks WHERE cluster_id = ?',
+            (cluster_id,)).fetchone()
+        resume_from = row[0] if row else None
+
+        stored, newest_created, oldest_active = 0, None, None
+        for step_info in aws_api.iter_cluster_steps(cluster_id):
+            created = emr.utils.to_epoch_seconds(
+                step_info['Status']['Timeline']['CreationDateTime'])
+            if resume_from is not None and created < resume_from:
+                break
+
+            newest_created = max(newest_created or created, created)
+            if step_info['Status']['State'] not in TERMINAL_STEP_STATES:
+                oldest_active = min(oldest_active or created, created)
+            elif self.record(cluster_id, cluster_name, step_info):
+                stored += 1
+
+        mark = oldest_active or newest_created
+        if mark is not None:
+            with self.conn:
+                self.conn.execute(
+                    'INSERT OR REPLACE INTO sync_marks VALUES (?, ?)',
+                    (cluster_id, mark))
+        return stored
+
+    def durations(self, job_name, cluster_name=None):
+        """Get the sorted run durations of completed steps for a job.
+
+        Args:
+            job_name (str): The name of the job/step.
+            cluster_name (str): Optional cluster name to filter by.
+
+        Returns:
+            list: Step durations in seconds, in ascending order.
+        """
+        query = 'SELECT duration FROM steps WHERE job_name = ?'
+        args = [job_name]
+        if cluster_name:
+            query += ' AND cluster_name = ?'
+            args.append(cluster_name)
+        query += ' ORDER BY duration'
+        return [r[0] for r in self.conn.execute(query, args)]
+
+    def percentiles(self, job_name, cluster_name=None):
+        """Get the count, p50 and p95 run durations for a job.
+
+        Args:
+            job_name (str): The name of the job/step.
+            cluster_name (str): Optional cluster name to filter by.
+
+        Returns:
+            dict: A dictionary with keys 'count', 'p50' and 'p95'. The
+                durations are in seconds, or None if no steps are stored.
+        """
+        durations = self.durations(job_name, cluster_name)
+        return {
+            'count': len(durations),
+            'p50': percentile(durations, 50),
+            'p95': percentile(durations, 95)
+        }
+
+    def predict_runtime(self, job_name, cluster_name=None):
+        """Predict the run duration of a job from its median history.
+
+        Args:
+            job_name (str): The name of the job/step.
+            cluster_name (str): Optional cluster name to filter by.
+
+        Returns:
+            float: Predicted duration in seconds, or None if no steps are
+                stored for the job.
+        """
+        return percentile(self.durations(job_name, cluster_name), 50)
+
+
+def percentile(sorted_values, pct):
+    """Compute a percentile with linear interpolation between ranks.
+
+    Args:
+        sorted_values (list): Values in ascending order.
+        pct (float): Percentile to compute, between 0 and 100.
+
+    Returns:
+        float: The interpolated percentile, or None for an empty list.
+    """
+    if not sorted_values:
+        return None
+    rank = (len(sorted_values) - 1) * pct / 100.0
+    lower, upper = int(math.floor(rank)), int(math.ceil(rank))
+    return sorted_values[lower] + \
+        (sorted_values[upper] - sorted_values[lower]) * (rank - lower)
+
+
+def next_poll_interval(predicted_seconds, seconds_elapsed, job_timeout=None,
+                       default=60):
+    """Choose how long to sleep before the next poll of a step.
+
+    Sleeps until shortly before the predicted end of the step, leaving a
+    lead of 10% of the prediction (at least one default interval), and never
+    past the job timeout. Falls back to the default interval when there is
+    no prediction or the step has already overrun it.
+
+    Args:
+        predicted_seconds (float): Predicted step duration, or None.
+        seconds_elapsed (float): Seconds since the step was created, or None
+            if unknown.
+        job_timeout (int): Optional job timeout in minutes.
+        default (int): Minimum and fallback interval in seconds.
+
+    Returns:
+        int: Seconds to sleep before the next poll.
+    """
+    if predicted_seconds is None or seconds_elapsed is None:
+        return default
+
+    lead = max(default, 0.1 * predicted_seconds)
+    interval = predicted_seconds - seconds_elapsed - lead
+    if job_timeout is not None:
+        interval = min(interval, job_timeout * 60 - seconds_elapsed)
+    return int(max(default, interval))
+
+
+@click.command()
+@click.option('--history-db',
+              help='Path to the step history database.',
+              required=True)
+@click.option('--job-name',
+              help='Name of the EMR Step to report on.',
+              required=True)
+@click.option('--cluster-name',
+              default='',
+              help='Optional EMR cluster name to filter by.')
+@click.option('--sync',
+              is_flag=True,
+              help='Sync completed steps from the named cluster first.')
+@click.option('--profile',
+              default='',
+              help='Optional AWS profile credentials to be used.')
+def query_history(history_db, job_name, cluster_name, sync, profile):
+    history = StepHistory(history_db)
+    if sync:
+        aws_api = emr.utils.AWSApi(profile) if profile else emr.utils.AWSApi()
+        for cluster_info in aws_api.get_emr_cluster_with_name(cluster_name):
+            count = history.sync(aws_api, cluster_info['id'], cluster_name)
+            logging.info(
+                'cluster={}, action=sync-history, clusterId={}, '
+                'newSteps={}'.format(cluster_name, cluster_info['id'], count))
+
+    stats = history.percentiles(job_name, cluster_name or None)
+    print(json.dumps({
+        'job': job_name,
+        'cluster': cluster_name,
+        'count': stats['count'],
+        'p50Minutes': _to_minutes(stats['p50']),
+        'p95Minutes': _to_minutes(stats['p95'])
+    }))
+    history.close()
+
+
+def _to_minutes(seconds):
+    return None if seconds is None else round(seconds / 60.0, 1)
+
+
+if __name__ == '__main__':
+    log_config = emr.utils.load_config('logging.yml', 'LOG_CFG')
+    logging.config.dictConfig(log_config)
+    query_history()
@@ -1,6 +1,8 @@
 from __future__ import print_function
 import click
+import contextlib
 import datetime
+import functools
 import json
 import logging
 import pytz
@@ -8,11 +10,21 @@ import time
 import collections
 import logging.config
 import six
-from functools import reduce
+import sqlite3
+from botocore.exceptions import BotoCoreError, ClientError
 
+import emr.admission
+import emr.history
+import emr.metrics
+import emr.profiling
+import emr.specs
+import emr.status
+import emr.step_cache
+import emr.trace
 import emr.utils
+import emr.yarn
 from emr.templates import spark_template, add_spark_step_template
-from emr.constants import VALID_RUNTIMES, EXTRACT_KEYS
+from emr.constants import VALID_RUNTIMES, EXTRACT_KEYS, FAILED_STEP_STATES
 
 
 @click.command()
@@ -58,10 +70,88 @@ from emr.constants import VALID_RUNTIMES, EXTRACT_KEYS
               default='',
               help='Extra configs for the Spark application.')
 @click.option('--main-class', help='Main class of the Spark application.')
+@click.option('--history-db',
+              default='',
+              help='Optional step history database used to predict runtime.')
+@click.option('--status-port',
+              type=int,
+              help='Optional port to serve the polling status as JSON on.')
+@click.option('--job-spec',
+              default='',
+              envvar='JOB_SPEC',
+              help='Optional YAML file of job specs used as defaults; '
+                   'falls back to the JOB_SPEC environment variable.')
+@click.option('--shared-step-cache',
+              default='',
+              help='Optional directory of step listings shared by pollers.')
+@click.option('--step-cache-ttl',
+              default=30,
+              help='Seconds a shared step listing is reused.')
+@click.option('--profile-run',
+              default='',
+              help='Optional path to write a profiling trace of the run to.')
+@click.option('--max-active-steps',
+              type=int,
+              help='Optional limit of PENDING and RUNNING steps on the '
+                   'cluster; submissions wait until below it.')
+@click.option('--priority',
+              default=0,
+              help='Priority of the submission when waiting for the '
+                   'active step limit; higher goes first.')
+@click.option('--admission-dir',
+              default='',
+              help='Optional directory of the admission queues shared by '
+                   'processes waiting for the active step limit.')
+@click.option('--yarn-progress',
+              is_flag=True,
+              help='Option to poll YARN for the progress of running steps.')
+@click.option('--retry-states',
+              default='',
+              help='Comma-separated final step states that resubmit the '
+                   'job, e.g. INTERRUPTED,CANCELLED.')
+@click.option('--max-attempts',
+              default=1,
+              help='Maximum number of submissions of the job, including '
+                   'retries.')
+@click.option('--retry-backoff',
+              default=0,
+              help='Seconds to wait before the first retry; doubled for '
+                   'each later retry.')
+@click.option('--record-trace',
+              default='',
+              help='Optional file to record the EMR API calls of the run to.')
+@click.option('--replay-trace',
+              default='',
+              help='Optional recorded trace to answer EMR API calls from, '
+                   'instead of AWS.')
+@click.option('--replay-speed',
+              default=0.0,
+              help='Real-time speed-up of a replay, e.g. 60 to replay a '
+                   'minute per second; 0 replays without waiting.')
 def parse_arguments(context, env, profile, job_name, job_runtime, job_timeout,
                     cluster_name, artifact_path, poll_cluster, terminate,
-                    dryrun, job_args, job_configs, main_class):
-    handle_job_request(context.params)
+                    dryrun, job_args, job_configs, main_class, history_db,
+                    status_port, job_spec, shared_step_cache,
+                    step_cache_ttl, profile_run, max_active_steps, priority,
+                    admission_dir, yarn_progress, retry_states, max_attempts,
+                    retry_backoff, record_trace, replay_trace, replay_speed):
+    def run():
+        params = context.params
+        if job_spec:
+            with emr.profiling.span('config-load', jobSpec=job_spec):
+                spec = emr.specs.load_job_specs(job_spec).resolve(
+                    env, cluster_name, job_name)
+            default_source = click.core.ParameterSource.DEFAULT
+            explicit_keys = set(
+                k for k in params
+                if context.get_parameter_source(k) != default_source)
+            params = emr.specs.apply_job_spec(params, spec, explicit_keys)
+        handle_job_request(params)
+
+    if profile_run:
+        emr.profiling.profile_run(run, profile_run)
+    else:
+        run()
 
 
 def handle_job_request(params):
@@ -79,6 +169,31 @@ def handle_job_request(params):
             - poll_cluster: Whether to poll for job completion
             - terminate: Whether to terminate cluster after completion
             - dryrun: Whether to skip actual execution
+            - history_db: Step history database path used to schedule polls
+              near the predicted end of the job (optional)
+            - status_port: Port of an HTTP endpoint serving the polling
+              status as JSON while polling (optional)
+            - shared_step_cache: Directory of step listings shared with
+              other polling processes on the host (optional)
+            - step_cache_ttl: Seconds a shared step listing is reused
+            - max_active_steps: Limit of in-flight steps on the cluster that
+              the submission waits for (optional)
+            - priority: Priority of the submission while waiting
+            - admission_dir: Directory of the admission queues shared with
+              other processes submitting to the cluster (optional)
+            - yarn_progress: Whether to poll the YARN ResourceManager for the
+              progress of the running step, failing as soon as YARN does
+            - retry_states: Final step states that resubmit the job, as a
+              list or comma-separated string (optional)
+            - max_attempts: Maximum number of submissions of the job
+            - retry_backoff: Seconds to wait before the first retry, doubled
+              for each later retry
+            - record_trace: File to record the EMR API calls and AWS CLI
+              commands of the run to (optional)
+            - replay_trace: Recorded trace to answer the EMR API calls and
+              AWS CLI commands from, on a virtual clock (optional)
+            - replay_speed: Real-time speed-up of the replay, or 0 to replay
+              without waiting
 
     Returns:
         str: The AWS CLI command used to submit the job step, or empty string.
@@ -99,10 +214,66 @@ def handle_job_request(params):
         job_runtime.lower() in VALID_RUNTIMES, log_msg,
         '--job-runtime should be in {}'.format(VALID_RUNTIMES))
 
-    aws_api = emr.utils.AWSApi(profile) if profile else emr.utils.AWSApi()
+    config['retry_states'] = parse_retry_states(config.get('retry_states'))
+    log_msg = ('environment={}, cluster={}, job={}, '
+               'action=check-retry-states, retryStates={}'.format(
+                   env, cluster_name, job_name,
+                   ','.join(config['retry_states'])))
+    emr.utils.log_assertion(
+        set(config['retry_states']) <= set(FAILED_STEP_STATES), log_msg,
+        '--retry-states should be in {}'.format(FAILED_STEP_STATES))
+
+    recorder, replayer = None, None
+    with emr.profiling.span('client-creation'):
+        if config.get('replay_trace'):
+            replayer = emr.trace.TraceReplayer(
+                config['replay_trace'], config.get('replay_speed') or 0)
+            aws_api = replayer.aws_api()
+        else:
+            aws_api = \
+                emr.utils.AWSApi(profile) if profile else emr.utils.AWSApi()
+            if config.get('shared_step_cache'):
+                aws_api.step_cache = emr.step_cache.SharedStepCache(
+                    config['shared_step_cache'],
+                    config.get('step_cache_ttl', 30))
+        if config.get('record_trace'):
+            recorder = emr.trace.TraceRecorder(config['record_trace'])
+            recorder.wrap_api(aws_api)
+            logging.info(
+                'environment={}, cluster={}, job={}, action=record-trace, '
+                'trace={}'.format(
+                    env, cluster_name, job_name, config['record_trace']))
+
+    try:
+        return run_job_request(config, aws_api, replayer, recorder)
+    finally:
+        if recorder:
+            recorder.close()
+
+
+def run_job_request(config, aws_api, replayer=None, recorder=None):
+    """Submit, poll and terminate a job with a validated configuration.
+
+    Args:
+        config (dict): Job configuration, as built by handle_job_request.
+        aws_api (emr.utils.AWSApi): Client used for all AWS calls.
+        replayer (emr.trace.TraceReplayer): Optional trace answering the
+            client's calls, whose virtual clock paces the polling.
+        recorder (emr.trace.TraceRecorder): Optional recorder wrapping the
+            client.
+
+    Returns:
+        str: The AWS CLI command used to submit the job step, or empty string.
+    """
+    env, cluster_name, job_name = \
+        config['env'], config['cluster_name'], config['job_name']
+    # AWS CLI commands go through the client when it is replayed or recorded
+    run_command = aws_api.run_command if replayer or recorder else None
+    clock = replayer.clock if replayer else None
 
     # get existing cluster info
-    clust_info = aws_api.get_emr_cluster_with_name(cluster_name)
+    with emr.profiling.span('cluster-resolution'):
+        clust_info = aws_api.get_emr_cluster_with_name(cluster_name)
     log_msg = (
         'environment={}, cluster={}, job={}, action=get-clusters, '
         'count={}, clusterList={}'.format(
@@ -121,30 +292,203 @@ def handle_job_request(params):
     # add cluster id to the config
     cluster_id, config['cluster_id'] = clust_info[0]['id'], clust_info[0]['id']
 
-    cli_cmd = ''
+    cli_cmd, submitted = '', False
     # submit a new EMR Step to the running cluster
-    if artifact_path:
-        config['step_args'] = \
-            emr.utils.tokenize_emr_step_args(spark_template.render(config))
-
-        cli_cmd = add_spark_step_template.render(config)
+    if config['artifact_path']:
+        with emr.profiling.span('template-render'):
+            config['step_args'] = emr.utils.tokenize_emr_step_args(
+                spark_template.render(config))
+            cli_cmd = add_spark_step_template.render(config)
         logging.info(cli_cmd)
-        if not dryrun:
-            output = emr.utils.run_shell_command(cli_cmd)
-            print(output)
-            log_msg = ('environment={}, cluster={}, job={}, action='
-                       'add-job-step'.format(env, cluster_name, job_name))
-            emr.utils.log_assertion('StepIds' in output, log_msg,
-                                    'StepIds not found in terminal output')
+        if not config['dryrun']:
+            submit_job_step(aws_api, config, cli_cmd, run_command)
+            submitted = True
 
     # monitor state of the EMR Step (Spark Job)
-    if poll_cluster:
-        job_state = 'UNKNOWN'
+    if config['poll_cluster']:
+        status = emr.status.PollStatus(env, cluster_name, job_name, cluster_id)
+        status_server = start_status_server(status, config)
+        resubmit = functools.partial(
+            submit_job_step, aws_api, config, cli_cmd, run_command) \
+            if submitted else None
+        try:
+            poll_job_step(aws_api, config, submitted, status, resubmit, clock)
+        finally:
+            if status_server:
+                status_server.stop()
+
+        if config['terminate']:
+            with emr.profiling.span('termination'):
+                aws_api.terminate_clusters(cluster_name, config)
+    return cli_cmd
+
+
+def start_status_server(status, config):
+    """Start serving the polling status, if a status port is configured.
+
+    The endpoint is optional, so failing to bind its port (e.g. a port taken
+    by another job sharing the same spec) is logged instead of failing a job
+    whose step may already be submitted.
+
+    Args:
+        status (emr.status.PollStatus): The polling status to serve.
+        config (dict): Job configuration, as built by handle_job_request.
+
+    Returns:
+        emr.status.StatusServer: The started server, or None.
+    """
+    if config.get('status_port') is None:
+        return None
+    try:
+        status_server = emr.status.StatusServer(status, config['status_port'])
+    except (OSError, IOError) as e:
+        logging.warning(
+            'environment={}, cluster={}, job={}, action=serve-status, '
+            'port={}, error={}'.format(
+                config['env'], config['cluster_name'], config['job_name'],
+                config['status_port'], e))
+        return None
+    status_server.start()
+    logging.info(
+        'environment={}, cluster={}, job={}, action=serve-status, '
+        'port={}'.format(
+            config['env'], config['cluster_name'], config['job_name'],
+            status_server.port))
+    return status_server
+
+
+def parse_retry_states(retry_states):
+    """Normalize retry states given as a list or comma-separated string.
+
+    Args:
+        retry_states: A list of step states, a comma-separated string of
+            step states, or None.
+
+    Returns:
+        list: Upper-case step states.
+    """
+    if not retry_states:
+        return []
+    if isinstance(retry_states, six.string_types):
+        retry_states = retry_states.split(',')
+    return [s.strip().upper() for s in retry_states if s.strip()]
+
+
+def submit_job_step(aws_api, config, cli_cmd, run_command=None):
+    """Submit the job's EMR step with the AWS CLI.
+
+    Args:
+        aws_api (emr.utils.AWSApi): Client used to list active steps when
+            waiting for the active step limit.
+        config (dict): Job configuration, as built by handle_job_request.
+        cli_cmd (str): The rendered AWS CLI add-steps command.
+        run_command (callable): Optional function executing the command,
+            e.g. to record or replay it. Defaults to
+            emr.utils.run_shell_command.
+
+    Raises:
+        ValueError: If the AWS CLI output has no step ids.
+    """
+    with admit_job_step(aws_api, config):
+        with emr.profiling.span('submission'):
+            output = (run_command or emr.utils.run_shell_command)(cli_cmd)
+        print(output)
+        log_msg = ('environment={}, cluster={}, job={}, action='
+                   'add-job-step'.format(
+                       config['env'], config['cluster_name'],
+                       config['job_name']))
+        emr.utils.log_assertion('StepIds' in output, log_msg,
+                                'StepIds not found in terminal output')
+
+
+@contextlib.contextmanager
+def admit_job_step(aws_api, config):
+    """Wait for the cluster's active step limit before submitting a step.
+
+    Args:
+        aws_api (emr.utils.AWSApi): Client used to list active steps.
+        config (dict): Job configuration, as built by handle_job_request.
+            Nothing is waited for unless max_active_steps is set.
+    """
+    if not config.get('max_active_steps'):
+        yield
+        return
+
+    controller = emr.admission.get_controller(
+        aws_api, config['cluster_id'], config['max_active_steps'],
+        config.get('admission_dir') or None)
+    with emr.profiling.span('admission'):
+        admission = controller.admit(config.get('priority') or 0)
+    stats = controller.stats()
+    logging.info(
+        'environment={}, cluster={}, job={}, action=admit-job-step, '
+        'priority={}, waitSeconds={:.1f}, queueDepth={}, inFlight={}'.format(
+            config['env'], config['cluster_name'], config['job_name'],
+            admission.priority, admission.wait_seconds,
+            stats['queueDepth'], stats['inFlight']))
+    with admission:
+        yield
+
+
+def poll_job_step(aws_api, config, submitted=False, status=None,
+                  resubmit=None, clock=None):
+    """Poll the newest EMR step for a job until it completes.
+
+    When the step ends in one of the configured retry states and attempts
+    remain, the job is resubmitted after the retry backoff, and polling
+    continues with the new step.
 
+    Args:
+        aws_api (emr.utils.AWSApi): Client used to list cluster steps.
+        config (dict): Job configuration, as built by handle_job_request.
+        submitted (bool): Whether the step was just submitted, in which case
+            no time has elapsed for it yet.
+        status (emr.status.PollStatus): Optional in-memory status updated
+            after every poll.
+        resubmit (callable): Optional function submitting the job again.
+            Without it, the job is never retried.
+        clock (emr.trace.VirtualClock): Optional clock used to sleep between
+            polls and measure elapsed time, e.g. when replaying a trace.
+
+    Returns:
+        dict: The completed step dictionary.
+
+    Raises:
+        ValueError: If no step is found, the step fails and is not retried,
+            or the job timeout is exceeded.
+    """
+    env, cluster_name, job_name, cluster_id, job_timeout = \
+        config['env'], config['cluster_name'], config['job_name'], \
+        config['cluster_id'], config.get('job_timeout')
+
+    job_state, ticks = 'UNKNOWN', 0
+    retry_states = parse_retry_states(config.get('retry_states'))
+    max_attempts = config.get('max_attempts') or 1
+    attempts = []
+    yarn_probe = emr.yarn.YarnProgressProbe(aws_api, cluster_id, job_name) \
+        if config.get('yarn_progress') else None
+    seconds_elapsed = 0 if submitted else None
+    sleep = clock.sleep if clock else time.sleep
+
+    if retry_states and not resubmit:
+        logging.info(
+            'environment={}, cluster={}, job={}, action=disable-retries, '
+            'retryStates={}, reason=step-not-submitted'.format(
+                env, cluster_name, job_name, ','.join(retry_states)))
+
+    history, predicted_seconds = open_step_history(aws_api, config)
+    try:
         while job_state != 'COMPLETED':
-            time.sleep(60)
-            jobs = aws_api.list_cluster_steps(
-                cluster_id, job_name, active_only=False)
+            with emr.profiling.span('poll-sleep'):
+                sleep(emr.history.next_poll_interval(
+                    predicted_seconds, seconds_elapsed, job_timeout))
+            ticks += 1
+            with emr.profiling.span('poll-tick', tick=ticks):
+                request_start = time.time()
+                jobs = aws_api.list_cluster_steps(
+                    cluster_id, job_name, active_only=False)
+            if status:
+                status.record_api_call(time.time() - request_start)
             if job_state == 'UNKNOWN':
                 log_msg = (
                     'environment={}, cluster={}, job={}, '
@@ -156,14 +500,13 @@ def handle_job_request(params):
                         len(jobs),
                         job_name))
 
-            def compare_times(j1, j2):
-                j1_creation = j1['Status']['Timeline']['CreationDateTime']
-                j2_creation = j2['Status']['Timeline']['CreationDateTime']
+            current_job = emr.metrics.newest_step(jobs)
+            if any(a['stepId'] == current_job['Id'] for a in attempts):
+                # the resubmitted step is not listed yet
+                continue
 
-                return j1 if j1_creation > j2_creation else j2
-            current_job = reduce(compare_times, jobs)
-
-            job_metrics = cluster_step_metrics(current_job)
+            job_metrics = cluster_step_metrics(
+                current_job, clock.now() if clock else None)
             logging.info(
                 'environment={}, cluster={}, job={}, action=poll-cluster, '
                 'stepId={}, state={}, createdTime={}, minutesElapsed={}'
@@ -172,11 +515,51 @@ def handle_job_request(params):
                     job_metrics['state'],
                     job_metrics['createdTime'],
                     job_metrics['minutesElapsed']))
+            yarn_progress = None
+            if yarn_probe and job_metrics['state'] == 'RUNNING':
+                yarn_progress = yarn_step_progress(
+                    yarn_probe, current_job, config)
+                job_metrics['yarn'] = yarn_progress
+            if status:
+                status.update(job_metrics)
             job_state = job_metrics['state']
             minutes_elapsed = job_metrics['minutesElapsed']
+            seconds_elapsed = minutes_elapsed * 60
+
+            # resubmit the job on a retryable final state
+            yarn_failed = yarn_progress and \
+                yarn_progress['finalStatus'] in emr.yarn.YARN_FAILED_STATES
+            final_state = 'FAILED' if yarn_failed else job_state
+            if resubmit and final_state in retry_states and \
+                    len(attempts) + 1 < max_attempts:
+                attempts.append(record_attempt(
+                    config, job_metrics, final_state, len(attempts) + 1,
+                    status))
+                backoff = (config.get('retry_backoff') or 0) * \
+                    2 ** (len(attempts) - 1)
+                logging.info(
+                    'environment={}, cluster={}, job={}, '
+                    'action=retry-job-step, attempt={}, maxAttempts={}, '
+                    'backoffSeconds={}'.format(
+                        env, cluster_name, job_name, len(attempts) + 1,
+                        max_attempts, backoff))
+                with emr.profiling.span('retry-backoff'):
+                    sleep(backoff)
+                resubmit()
+                job_state, seconds_elapsed = 'RETRYING', 0
+                continue
+
+            # record the last attempt before completing or failing the job
+            timed_out = \
+                job_timeout is not None and minutes_elapsed > job_timeout
+            finished = final_state in FAILED_STEP_STATES + ['COMPLETED']
+            if finished or timed_out:
+                attempts.append(record_attempt(
+                    config, job_metrics, final_state, len(attempts) + 1,
+                    status))
 
             # check for termination events: failure or timeout exceeded
-            if job_metrics['state'] == 'FAILED':
+            if job_metrics['state'] in FAILED_STEP_STATES:
                 log_msg = (
                     'environment={}, cluster={}, job={}, '
                     'action=exit-failed-state, stepId={}, state={}'.format(
@@ -186,10 +569,27 @@ def handle_job_request(params):
                         job_metrics['id'],
                         job_metrics['state']))
                 emr.utils.log_assertion(
-                    job_metrics['state'] != 'FAILED',
+                    job_metrics['state'] not in FAILED_STEP_STATES,
                     log_msg,
                     'Job in invalid state {}'.format(job_metrics['state']))
 
+            elif yarn_failed:
+                log_msg = (
+                    'environment={}, cluster={}, job={}, '
+                    'action=exit-failed-yarn-state, stepId={}, '
+                    'applicationId={}, finalStatus={}'.format(
+                        env,
+                        cluster_name,
+                        job_name,
+                        job_metrics['id'],
+                        yarn_progress['applicationId'],
+                        yarn_progress['finalStatus']))
+                emr.utils.log_assertion(
+                    False,
+                    log_msg,
+                    'Job in invalid YARN state {}'.format(
+                        yarn_progress['finalStatus']))
+
             elif job_timeout is not None and minutes_elapsed > job_timeout:
                 log_msg = \
                     ('environment={}, cluster={}, job={}, action='
@@ -201,16 +601,149 @@ def handle_job_request(params):
                     minutes_elapsed <= job_timeout, log_msg,
                     'Job exceeded timeout {}'.format(job_timeout))
 
-        if terminate:
-            aws_api.terminate_clusters(cluster_name, config)
-    return cli_cmd
+        if history:
+            record_step_history(history, config, current_job)
+    finally:
+        if history:
+            history.close()
+    return current_job
+
+
+def open_step_history(aws_api, config):
+    """Open the step history and predict the job's runtime from it.
+
+    The prediction only schedules polls, so a failure to open or sync the
+    history (e.g. throttling, or a locked or unwritable database) is logged
+    and polling falls back to the default interval.
+
+    Args:
+        aws_api (emr.utils.AWSApi): Client used to sync completed steps.
+        config (dict): Job configuration, as built by handle_job_request.
+
+    Returns:
+        tuple: The open emr.history.StepHistory and the predicted runtime in
+            seconds, or (None, None) without a usable history.
+    """
+    if not config.get('history_db'):
+        return None, None
+
+    history = None
+    try:
+        history = emr.history.StepHistory(config['history_db'])
+        history.sync(aws_api, config['cluster_id'], config['cluster_name'])
+        predicted_seconds = history.predict_runtime(
+            config['job_name'], config['cluster_name'])
+    except (BotoCoreError, ClientError, sqlite3.Error, OSError) as e:
+        logging.warning(
+            'environment={}, cluster={}, job={}, action=predict-runtime, '
+            'historyDb={}, exception={}, error={}'.format(
+                config['env'], config['cluster_name'], config['job_name'],
+                config['history_db'], type(e).__name__, e))
+        if history:
+            history.close()
+        return None, None
+
+    logging.info(
+        'environment={}, cluster={}, job={}, action=predict-runtime, '
+        'predictedSeconds={}'.format(
+            config['env'], config['cluster_name'], config['job_name'],
+            predicted_seconds))
+    return history, predicted_seconds
+
+
+def record_step_history(history, config, step_info):
+    """Record a completed step in the step history, logging any failure.
+
+    Args:
+        history (emr.history.StepHistory): The open step history.
+        config (dict): Job configuration, as built by handle_job_request.
+        step_info (dict): The completed step dictionary.
+    """
+    try:
+        history.record(config['cluster_id'], config['cluster_name'],
+                       step_info)
+    except (sqlite3.Error, OSError) as e:
+        logging.warning(
+            'environment={}, cluster={}, job={}, action=record-history, '
+            'historyDb={}, exception={}, error={}'.format(
+                config['env'], config['cluster_name'], config['job_name'],
+                config['history_db'], type(e).__name__, e))
+
+
+def record_attempt(config, job_metrics, state, attempt, status=None):
+    """Log a finished attempt of a job and add it to the polling status.
+
+    Args:
+        config (dict): Job configuration, as built by handle_job_request.
+        job_metrics (dict): Metrics of the attempt's step.
+        state (str): Final state of the attempt.
+        attempt (int): Attempt number, starting at 1.
+        status (emr.status.PollStatus): Optional in-memory polling status.
+
+    Returns:
+        dict: The attempt, with keys 'attempt', 'stepId', 'state',
+            'createdTime' and 'minutesElapsed'.
+    """
+    record = {
+        'attempt': attempt,
+        'stepId': job_metrics['id'],
+        'state': state,
+        'createdTime': job_metrics['createdTime'],
+        'minutesElapsed': job_metrics['minutesElapsed']
+    }
+    logging.info(
+        'environment={}, cluster={}, job={}, action=record-attempt, '
+        'attempt={}, stepId={}, state={}, minutesElapsed={}'.format(
+            config['env'], config['cluster_name'], config['job_name'],
+            attempt, record['stepId'], state, record['minutesElapsed']))
+    if status:
+        status.record_attempt(record)
+    return record
+
+
+def yarn_step_progress(probe, step_info, config):
+    """Poll YARN for the progress of a running step, logging the outcome.
+
+    Args:
+        probe (emr.yarn.YarnProgressProbe): Probe for the job's application.
+        step_info (dict): Step information dictionary from EMR API response.
+        config (dict): Job configuration, as built by handle_job_request.
+
+    Returns:
+        dict: The YARN progress, as returned by YarnProgressProbe.poll, or
+            None if the application or ResourceManager is unavailable.
+    """
+    try:
+        with emr.profiling.span('yarn-progress'):
+            progress = probe.poll(step_info)
+    except (BotoCoreError, ClientError, IOError, OSError, ValueError,
+            KeyError) as e:
+        logging.warning(
+            'environment={}, cluster={}, job={}, action=yarn-progress, '
+            'stepId={}, exception={}, error={}'.format(
+                config['env'], config['cluster_name'], config['job_name'],
+                step_info['Id'], type(e).__name__, e))
+        return None
+
+    if progress:
+        logging.info(
+            'environment={}, cluster={}, job={}, action=yarn-progress, '
+            'stepId={}, applicationId={}, state={}, finalStatus={}, '
+            'progress={}, runningContainers={}'.format(
+                config['env'], config['cluster_name'], config['job_name'],
+                step_info['Id'], progress['applicationId'], progress['state'],
+                progress['finalStatus'], progress['progress'],
+                progress['runningContainers']))
+    return progress
 
 
-def cluster_step_metrics(step_info):
+def cluster_step_metrics(step_info, now=None):
     """Extract metrics from an EMR cluster step.
 
     Args:
         step_info (dict): Step information dictionary from EMR API response.
+        now (datetime.datetime): Optional current time, in UTC. Defaults to
+            the system time.
 
     Returns:
         dict: A dictionary containing step metrics with keys:
@@ -223,7 +756,8 @@ def cluster_step_metrics(step_info):
     created_dt = step_info['Status']['Timeline']['CreationDateTime']
     str_created_dt = created_dt.strftime("%Y-%m-%dT%H-%M-%S")
     seconds_elapsed = \
-        (datetime.datetime.now(pytz.utc) - created_dt).total_seconds()
+        ((now or datetime.datetime.now(pytz.utc)) - created_dt) \
+        .total_seconds()
     minutes_elapsed = divmod(seconds_elapsed, 60)[0]
     return {
         'id': step_info['Id'],
@@ -0,0 +1,138 @@
+import contextlib
+import cProfile
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+
+# number of top allocation sites reported in the trace metadata
+TOP_ALLOCATIONS = 20
+
+_tracer = None
+
+
+class RunTracer(object):
+    """Collect wall-clock spans as Chrome trace events.
+
+    The events can be written to a JSON file and opened in chrome://tracing
+    or https://ui.perfetto.dev.
+
+    Attributes:
+        events (list): Trace event dictionaries recorded so far.
+    """
+    def __init__(self):
+        self.events = []
+        self._pid = os.getpid()
+        self._origin = time.time()
+
+    @contextlib.contextmanager
+    def span(self, name, **args):
+        """Record the wall-clock duration of a block as a complete event.
+
+        When tracemalloc is tracing, the traced memory at the end of the
+        block is recorded as a counter event too.
+
+        Args:
+            name (str): Name of the span.
+            **args: Extra values shown with the span in the trace viewer.
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            end = time.time()
+            self.events.append({
+                'name': name,
+                'cat': 'emr',
+                'ph': 'X',
+                'ts': self._micros(start),
+                'dur': round((end - start) * 1e6, 3),
+                'pid': self._pid,
+                'tid': threading.current_thread().ident,
+                'args': args
+            })
+            if tracemalloc.is_tracing():
+                current, peak = tracemalloc.get_traced_memory()
+                self.events.append({
+                    'name': 'memory',
+                    'ph': 'C',
+                    'ts': self._micros(end),
+                    'pid': self._pid,
+                    'args': {'current': current, 'peak': peak}
+                })
+
+    def write(self, trace_path, metadata=None):
+        """Write the recorded events as a Chrome trace-event JSON file.
+
+        Args:
+            trace_path (str): Path of the trace file.
+            metadata (dict): Optional values stored as the trace's otherData.
+        """
+        with open(trace_path, 'w') as f:
+            json.dump({
+                'traceEvents': self.events,
+                'displayTimeUnit': 'ms',
+                'otherData': metadata or {}
+            }, f)
+
+    def _micros(self, timestamp):
+        return round((timestamp - self._origin) * 1e6, 3)
+
+
+@contextlib.contextmanager
+def span(name, **args):
+    """Record a span on the active tracer, if a profiled run is in progress.
+
+    Args:
+        name (str): Name of the span.
+        **args: Extra values shown with the span in the trace viewer.
+    """
+    if _tracer is None:
+        yield
+    else:
+        with _tracer.span(name, **args):
+            yield
+
+
+def profile_run(func, trace_path):
+    """Run a function under cProfile, tracemalloc and span tracing.
+
+    Writes the Chrome trace to ``trace_path``, with the largest allocation
+    sites by growth in its metadata, and the cProfile stats to
+    ``<trace_path>.pstats``. Both are written even if the function raises.
+
+    Args:
+        func (callable): Function to run, without arguments.
+        trace_path (str): Path of the trace file.
+
+    Returns:
+        The return value of func.
+    """
+    global _tracer
+    _tracer = tracer = RunTracer()
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    start_snapshot = tracemalloc.take_snapshot()
+    try:
+        with tracer.span('run'):
+            profiler.enable()
+            try:
+                return func()
+            finally:
+                profiler.disable()
+    finally:
+        _tracer = None
+        end_snapshot = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        allocations = end_snapshot.compare_to(start_snapshot, 'lineno')
+        tracer.write(trace_path, {
+            'peakTracedMemory': peak,
+            'topAllocations': [str(s) for s in allocations[:TOP_ALLOCATIONS]]
+        })
+        profiler.dump_stats(trace_path + '.pstats')
+        logging.info('action=profile-run, trace={}, stats={}.pstats'.format(
+            trace_path, trace_path))
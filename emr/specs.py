@@ -0,0 +1,244 @@
+import collections
+import logging
+import os
+import pickle
+
+import six
+import yaml
+
+import emr.utils
+from emr.constants import SPEC_KEYS, VALID_RUNTIMES
+
+# bump when the compiled format or its validation changes, to invalidate
+# existing caches
+SPEC_CACHE_VERSION = 2
+
+SECTIONS = ['defaults', 'envs', 'clusters', 'jobs']
+
+JobSpec = collections.namedtuple('JobSpec', SPEC_KEYS)
+JobSpec.__new__.__defaults__ = (None,) * len(SPEC_KEYS)
+
+_compiled_specs = {}
+
+
+class CompiledSpecs(object):
+    """Validated, immutable job specs compiled from a YAML spec file.
+
+    Each env, cluster and job entry is stored as a sorted tuple of
+    (key, value) pairs, with job inheritance already flattened, so resolving
+    a spec is just an ordered merge of at most four entries.
+
+    Attributes:
+        defaults (tuple): Spec values applied to every job.
+        envs (dict): Spec values per environment name.
+        clusters (dict): Spec values per cluster name.
+        jobs (dict): Spec values per job name, including inherited values.
+    """
+    __slots__ = ('defaults', 'envs', 'clusters', 'jobs')
+
+    def __init__(self, defaults, envs, clusters, jobs):
+        self.defaults = defaults
+        self.envs = envs
+        self.clusters = clusters
+        self.jobs = jobs
+
+    def resolve(self, env, cluster_name, job_name):
+        """Resolve the spec for a job on a cluster in an environment.
+
+        Values are merged from least to most specific: defaults, then the
+        environment, then the cluster, then the job.
+
+        Args:
+            env (str): Environment name.
+            cluster_name (str): Name of the EMR cluster.
+            job_name (str): Name of the EMR step/job.
+
+        Returns:
+            JobSpec: The resolved spec; unset values are None.
+
+        Raises:
+            ValueError: If the job is not defined in the spec file.
+        """
+        if job_name not in self.jobs:
+            raise ValueError('Job {} not found in job specs'.format(job_name))
+
+        values = dict(self.defaults)
+        values.update(self.envs.get(env, ()))
+        values.update(self.clusters.get(cluster_name, ()))
+        values.update(self.jobs[job_name])
+        return JobSpec(**values)
+
+
+def compile_specs(raw_specs):
+    """Validate parsed job specs and compile them.
+
+    Args:
+        raw_specs (dict): Job specs, as parsed from YAML, with optional
+            'defaults', 'envs', 'clusters' and 'jobs' sections. A job may
+            name another job to inherit from with an 'extends' key.
+
+    Returns:
+        CompiledSpecs: The compiled job specs.
+
+    Raises:
+        ValueError: If a section, key or value is invalid, or job
+            inheritance is undefined or circular.
+    """
+    if not isinstance(raw_specs, dict):
+        raise ValueError('Job specs should be a mapping of sections')
+    unknown = set(raw_specs) - set(SECTIONS)
+    if unknown:
+        raise ValueError('Unknown job spec sections {}, expected {}'.format(
+            sorted(unknown), SECTIONS))
+
+    defaults = _compile_entry('defaults', raw_specs.get('defaults') or {})
+    envs, clusters = [
+        dict((name, _compile_entry('{}.{}'.format(section, name), entry))
+             for name, entry in six.iteritems(raw_specs.get(section) or {}))
+        for section in ('envs', 'clusters')]
+
+    raw_jobs = raw_specs.get('jobs') or {}
+    jobs = {}
+    for job_name in raw_jobs:
+        jobs[job_name] = _compile_entry(
+            'jobs.{}'.format(job_name), _flatten_job(raw_jobs, job_name))
+    return CompiledSpecs(defaults, envs, clusters, jobs)
+
+
+def _flatten_job(raw_jobs, job_name):
+    chain = []
+    while job_name is not None:
+        if job_name in chain:
+            raise ValueError('Circular job spec inheritance: {}'.format(
+                ' -> '.join(chain + [job_name])))
+        if job_name not in raw_jobs:
+            raise ValueError('Job {} extends undefined job {}'.format(
+                chain[-1], job_name))
+        chain.append(job_name)
+        job_name = (raw_jobs[job_name] or {}).get('extends')
+
+    values = {}
+    for name in reversed(chain):
+        values.update(raw_jobs[name] or {})
+    values.pop('extends', None)
+    return values
+
+
+def _compile_entry(name, entry):
+    if not isinstance(entry, dict):
+        raise ValueError('Job spec {} should be a mapping'.format(name))
+    unknown = set(entry) - set(SPEC_KEYS)
+    if unknown:
+        raise ValueError('Unknown keys {} in job spec {}'.format(
+            sorted(unknown), name))
+    if 'job_runtime' in entry and \
+            str(entry['job_runtime']).lower() not in VALID_RUNTIMES:
+        raise ValueError('job_runtime in job spec {} should be in {}'.format(
+            name, VALID_RUNTIMES))
+    for key in ('job_timeout', 'status_port', 'step_cache_ttl',
+                'max_active_steps', 'priority', 'max_attempts',
+                'retry_backoff'):
+        # bool is a subclass of int, but `job_timeout: true` is a mistake
+        is_int = isinstance(entry.get(key), int) and \
+            not isinstance(entry.get(key), bool)
+        if key in entry and not is_int:
+            raise ValueError('{} in job spec {} should be an integer'.format(
+                key, name))
+    return tuple(sorted(entry.items()))
+
+
+def load_job_specs(file_name, env_key='JOB_SPEC'):
+    """Load compiled job specs, reusing a cache when the file is unchanged.
+
+    Compiled specs are cached in memory and pickled next to the spec file
+    (as ``<file>.cache``), keyed by the file's modification time and size,
+    so repeated invocations skip YAML parsing and validation. An unwritable
+    cache location only disables the file cache.
+
+    Args:
+        file_name: Path of the YAML job spec file, relative to the working
+            directory. May be empty to use the environment variable.
+        env_key: Environment variable key holding the spec file path, used
+            only when file_name is empty.
+
+    Returns:
+        CompiledSpecs: The compiled job specs.
+
+    Raises:
+        ValueError: If the spec file cannot be read or is invalid.
+    """
+    file_name = file_name or os.getenv(env_key, '')
+    if not file_name:
+        raise ValueError('No job spec file given with --job-spec or {}'
+                         .format(env_key))
+    file_path = os.path.abspath(file_name)
+    try:
+        stat = os.stat(file_path)
+    except (OSError, IOError):
+        raise ValueError('Job spec file not found: {}'.format(file_path))
+    cache_key = (SPEC_CACHE_VERSION, stat.st_mtime, stat.st_size)
+
+    cached = _compiled_specs.get(file_path)
+    if cached and cached[0] == cache_key:
+        return cached[1]
+
+    cache_path = file_path + '.cache'
+    specs = _read_spec_cache(cache_path, cache_key)
+    if specs is None:
+        try:
+            raw_specs = emr.utils.load_config(file_path, None)
+        except yaml.YAMLError as e:
+            raise ValueError('Job spec file is not valid YAML: {}: {}'
+                             .format(file_path, e))
+        if not raw_specs:
+            raise ValueError('Job spec file is empty or unreadable: {}'
+                             .format(file_path))
+        specs = compile_specs(raw_specs)
+        _write_spec_cache(cache_path, cache_key, specs)
+
+    _compiled_specs[file_path] = (cache_key, specs)
+    return specs
+
+
+def _read_spec_cache(cache_path, cache_key):
+    try:
+        with open(cache_path, 'rb') as f:
+            key, specs = pickle.load(f)
+        return specs if key == cache_key else None
+    except (OSError, IOError):
+        return None
+    except (pickle.UnpicklingError, EOFError, AttributeError, TypeError,
+            ValueError):
+        logging.warning('Ignoring corrupt job spec cache: {}'.format(
+            cache_path))
+        return None
+
+
+def _write_spec_cache(cache_path, cache_key, specs):
+    tmp_path = '{}.{}.tmp'.format(cache_path, os.getpid())
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((cache_key, specs), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except (OSError, IOError):
+        logging.warning('Failed to write job spec cache: {}'.format(
+            cache_path))
+
+
+def apply_job_spec(params, spec, explicit_keys):
+    """Fill job parameters from a resolved spec.
+
+    Args:
+        params (dict): Job parameters, as passed to handle_job_request.
+        spec (JobSpec): The resolved job spec.
+        explicit_keys (set): Parameters set explicitly on the command line,
+            which take precedence over the spec.
+
+    Returns:
+        dict: A copy of params with spec values applied.
+    """
+    merged = dict(params)
+    for key, value in six.iteritems(spec._asdict()):
+        if value is not None and key not in explicit_keys:
+            merged[key] = value
+    return merged
@@ -0,0 +1,162 @@
+import collections
+import json
+import logging
+import threading
+import time
+
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from six.moves.socketserver import ThreadingMixIn
+
+from emr.history import percentile
+
+# number of recent API call latencies kept for the latency stats
+LATENCY_WINDOW = 100
+
+
+class PollStatus(object):
+    """Thread-safe, in-memory state of an EMR step being polled.
+
+    The poll loop updates it after every poll, and the status server reads
+    from it, so answering a status request never calls EMR.
+
+    Attributes:
+        env (str): Environment name.
+        cluster_name (str): Name of the EMR cluster.
+        job_name (str): Name of the EMR step/job.
+        cluster_id (str): The ID of the EMR cluster.
+    """
+    def __init__(self, env, cluster_name, job_name, cluster_id):
+        self.env = env
+        self.cluster_name = cluster_name
+        self.job_name = job_name
+        self.cluster_id = cluster_id
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._step = {}
+        self._polls = 0
+        self._last_poll = None
+        self._api_calls = 0
+        self._attempts = []
+        self._latencies = collections.deque(maxlen=LATENCY_WINDOW)
+
+    def update(self, job_metrics):
+        """Record the outcome of a poll.
+
+        Args:
+            job_metrics (dict): Step metrics, as returned by
+                emr.job_client.cluster_step_metrics.
+        """
+        with self._lock:
+            self._step = dict(job_metrics)
+            self._polls += 1
+            self._last_poll = time.time()
+
+    def record_attempt(self, attempt):
+        """Record a finished attempt of a retried job.
+
+        Args:
+            attempt (dict): The attempt, as built by
+                emr.job_client.record_attempt.
+        """
+        with self._lock:
+            self._attempts.append(dict(attempt))
+
+    def record_api_call(self, seconds):
+        """Record the latency of an EMR API call.
+
+        Args:
+            seconds (float): Wall-clock duration of the call.
+        """
+        with self._lock:
+            self._api_calls += 1
+            self._latencies.append(seconds)
+
+    def snapshot(self):
+        """Get a JSON-serializable copy of the current state.
+
+        Returns:
+            dict: The job identifiers, latest step metrics, poll counters,
+                previous attempts and API latency stats in milliseconds over
+                recent calls.
+        """
+        with self._lock:
+            now = time.time()
+            latencies = sorted(self._latencies)
+            return {
+                'environment': self.env,
+                'cluster': self.cluster_name,
+                'clusterId': self.cluster_id,
+                'job': self.job_name,
+                'step': dict(self._step),
+                'secondsSinceStart': round(now - self._started, 3),
+                'secondsSinceLastPoll':
+                    None if self._last_poll is None
+                    else round(now - self._last_poll, 3),
+                'polls': self._polls,
+                'attempts': [dict(a) for a in self._attempts],
+                'apiCalls': self._api_calls,
+                'apiLatencyMs': {
+                    'p50': _to_millis(percentile(latencies, 50)),
+                    'p95': _to_millis(percentile(latencies, 95)),
+                    'max': _to_millis(latencies[-1] if latencies else None)
+                }
+            }
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _StatusHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/status'):
+            self.send_error(404)
+            return
+        body = json.dumps(self.server.poll_status.snapshot()).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        logging.getLogger(__name__).debug(fmt, *args)
+
+
+class StatusServer(object):
+    """Embedded HTTP server exposing a PollStatus as JSON.
+
+    Serves ``GET /status`` from a background daemon thread.
+
+    Attributes:
+        status (PollStatus): The polling state to serve.
+        port (int): Port the server is bound to; resolved after binding when
+            port 0 is requested.
+
+    Example:
+        >>> server = StatusServer(status, 8080)
+        >>> server.start()
+        >>> server.stop()
+    """
+    def __init__(self, status, port, host='127.0.0.1'):
+        self.status = status
+        self._httpd = _ThreadingHTTPServer((host, port), _StatusHandler)
+        self._httpd.poll_status = status
+        self.port = self._httpd.server_address[1]
+        self._thread = None
+
+    def start(self):
+        """Start serving requests in a background thread."""
+        self._thread = threading.Thread(target=self._httpd.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving requests and release the port."""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread.join()
+
+
+def _to_millis(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+
+import emr.utils
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS listing (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    fetched REAL NOT NULL,
+    steps TEXT NOT NULL
+)
+'''
+
+
+class SharedStepCache(object):
+    """Step listings shared by polling processes on the same host.
+
+    Each cluster id and step state set is cached in its own SQLite file in
+    the cache directory. A fresh listing is read without locking; a stale
+    one is refreshed by whichever process first takes the file's write
+    lock, while the others wait on the lock and then read its result. This
+    keeps ListSteps calls per cluster at about one per TTL, however many
+    processes poll it.
+
+    Attributes:
+        directory (str): Directory holding the cache files.
+        ttl (float): Seconds a listing is served before being refreshed.
+        lock_timeout (float): Seconds to wait for another process to finish
+            refreshing a listing.
+
+    Example:
+        >>> aws_api = AWSApi()
+        >>> aws_api.step_cache = SharedStepCache('/var/tmp/emr-steps', 30)
+        >>> aws_api.list_cluster_steps('j-2MTD0ERMUNR2A', 'WordCount')
+    """
+    def __init__(self, directory, ttl=30, lock_timeout=120):
+        self.directory = directory
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, cluster_id, states, fetch):
+        """Get a step listing, refreshing it at most once per TTL.
+
+        Args:
+            cluster_id (str): The ID of the EMR cluster.
+            states (list): Step states the listing is filtered by.
+            fetch (callable): Function returning a fresh list of steps,
+                called only by the process refreshing the listing.
+
+        Returns:
+            list: Step dictionaries. If the cache file cannot be used (e.g.
+                it is locked past the lock timeout, corrupt or unwritable),
+                the error is logged and the listing is fetched directly.
+        """
+        fetched = []
+
+        def fetch_once():
+            fetched.append(None)
+            fetched[-1] = fetch()
+            return fetched[-1]
+
+        try:
+            return self._get(cluster_id, states, fetch_once)
+        except (sqlite3.Error, OSError) as e:
+            if fetched and fetched[-1] is None:
+                # the fetch itself failed
+                raise
+            logging.warning(
+                'clusterId={}, action=read-step-cache, directory={}, '
+                'exception={}, error={}'.format(
+                    cluster_id, self.directory, type(e).__name__, e))
+            return fetched[-1] if fetched else fetch()
+
+    def _get(self, cluster_id, states, fetch):
+        conn = self._connect(cluster_id, states)
+        try:
+            steps = self._read_fresh(conn)
+            if steps is not None:
+                return steps
+
+            # single-flight: the first process to take the lock refreshes
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                steps = self._read_fresh(conn)
+                if steps is None:
+                    steps = fetch()
+                    conn.execute(
+                        'INSERT OR REPLACE INTO listing VALUES (0, ?, ?)',
+                        (time.time(), json.dumps(
+                            steps, default=emr.utils.json_default)))
+                    logging.debug(
+                        'clusterId={}, action=refresh-step-cache, '
+                        'numSteps={}'.format(cluster_id, len(steps)))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            return steps
+        finally:
+            conn.close()
+
+    def _connect(self, cluster_id, states):
+        states_key = hashlib.sha1(
+            ','.join(sorted(states)).encode('utf-8')).hexdigest()[:12]
+        path = os.path.join(self.directory, '{}-{}.db'.format(
+            cluster_id, states_key))
+        conn = sqlite3.connect(path, timeout=self.lock_timeout,
+                               isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(SCHEMA)
+        return conn
+
+    def _read_fresh(self, conn):
+        row = conn.execute(
+            'SELECT fetched, steps FROM listing WHERE id = 0').fetchone()
+        if row is None or time.time() - row[0] > self.ttl:
+            return None
+        return json.loads(row[1], object_hook=emr.utils.json_object_hook)
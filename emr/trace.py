@@ -0,0 +1,392 @@
+import bisect
+import collections
+import functools
+import gzip
+import json
+import importlib
+import re
+import subprocess
+import threading
+import time
+from datetime import datetime
+
+import pytz
+from botocore.exceptions import BotoCoreError, ClientError
+
+import emr.utils
+
+TRACE_VERSION = 1
+
+REDACTED = '<redacted>'
+
+# keys whose values are replaced in recorded requests and responses; step
+# arguments are included as they often carry credentials for the job itself
+SENSITIVE_KEYS = re.compile(
+    r'password|secret|token|credential|accesskey|authorization|^args$',
+    re.IGNORECASE)
+
+# keys dropped from recorded responses
+DROPPED_KEYS = ['ResponseMetadata']
+
+# modules whose exception types are re-created on replay
+REPLAYED_EXCEPTION_MODULES = ['botocore.exceptions', 'builtins', 'subprocess']
+
+
+class ReplayedError(Exception):
+    """A recorded failure whose exception type cannot be re-created."""
+
+
+def redact(value):
+    """Copy an API request or response with sensitive fields redacted.
+
+    Args:
+        value: A JSON-like value from a boto3 call.
+
+    Returns:
+        A copy of the value, with the values of sensitive keys replaced and
+            response metadata (request ids and HTTP headers) dropped.
+    """
+    if isinstance(value, dict):
+        return dict((k, REDACTED if SENSITIVE_KEYS.search(k) else redact(v))
+                    for k, v in value.items() if k not in DROPPED_KEYS)
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    return value
+
+
+def shell_operation(cmd):
+    """Name an AWS CLI command by its subcommand.
+
+    Args:
+        cmd (str): The shell command, e.g.
+            'aws emr --profile qa terminate-clusters --cluster-id j-1'.
+
+    Returns:
+        str: The command up to its subcommand, without the profile option,
+            e.g. 'aws emr terminate-clusters'.
+    """
+    words, operation = cmd.split(), []
+    while words and len(operation) < 3:
+        word = words.pop(0)
+        if word == '--profile':
+            words = words[1:]
+        elif not word.startswith('--profile='):
+            operation.append(word)
+    return ' '.join(operation)
+
+
+class TraceRecorder(object):
+    """Record EMR API calls and AWS CLI commands to a trace file.
+
+    Each call is written as one line of gzipped JSON with its operation,
+    redacted parameters and response (or ClientError response, or the type
+    and message of any other exception), its start offset from the
+    beginning of the recording, and its duration. AWS CLI commands are
+    recorded by their subcommand only (e.g. 'aws emr add-steps'), as the
+    rest carries the profile and job arguments.
+
+    Attributes:
+        trace_path (str): Path of the trace file.
+
+    Example:
+        >>> recorder = TraceRecorder('incident.trace.gz')
+        >>> recorder.wrap_api(aws_api)
+        >>> handle the job with aws_api, then:
+        >>> recorder.close()
+    """
+    def __init__(self, trace_path):
+        self.trace_path = trace_path
+        self._origin = time.time()
+        self._lock = threading.Lock()
+        self._file = gzip.open(trace_path, 'wt')
+        self._write({'version': TRACE_VERSION, 'origin': self._origin})
+
+    def wrap_api(self, aws_api):
+        """Record every call made through an AWSApi client.
+
+        Args:
+            aws_api (emr.utils.AWSApi): The client to record.
+
+        Returns:
+            emr.utils.AWSApi: The same client, with its EMR and S3 clients
+                and its AWS CLI commands recorded. Commands still go through
+                the client's own run_command, so recording a replay never
+                runs the AWS CLI.
+        """
+        aws_api.emr = RecordingClient(aws_api.emr, 'emr', self)
+        aws_api.s3 = RecordingClient(aws_api.s3, 's3', self)
+        aws_api.run_command = functools.partial(
+            self.run_shell_command, run=aws_api.run_command)
+        return aws_api
+
+    def run_shell_command(self, cmd, run=None):
+        """Execute and record an AWS CLI command.
+
+        Args:
+            cmd (str): The shell command to execute.
+            run (callable): Optional function executing the command.
+                Defaults to emr.utils.run_shell_command.
+
+        Returns:
+            bytes: The command output.
+        """
+        return self.record('shell', shell_operation(cmd),
+                           run or emr.utils.run_shell_command, cmd)
+
+    def record(self, service, operation, func, *args, **kwargs):
+        """Call a function and record the call.
+
+        Args:
+            service (str): Service name, e.g. 'emr' or 'shell'.
+            operation (str): Operation name, e.g. 'list_steps'.
+            func (callable): The function to call.
+            *args: Positional arguments for func.
+            **kwargs: Keyword arguments for func, recorded as the request.
+
+        Returns:
+            The return value of func.
+        """
+        event = {
+            'service': service,
+            'operation': operation,
+            'params': redact(kwargs),
+            'start': round(time.time() - self._origin, 6)
+        }
+        try:
+            response = func(*args, **kwargs)
+            event['response'] = redact(
+                response.decode('utf-8') if isinstance(response, bytes)
+                else response)
+            return response
+        except ClientError as e:
+            event['error'] = redact(e.response)
+            raise
+        except Exception as e:
+            event['exception'] = _exception_info(service, e)
+            raise
+        finally:
+            event['duration'] = round(
+                time.time() - self._origin - event['start'], 6)
+            self._write(event)
+
+    def close(self):
+        """Flush and close the trace file."""
+        with self._lock:
+            self._file.close()
+
+    def _write(self, event):
+        line = json.dumps(event, default=emr.utils.json_default,
+                          separators=(',', ':'))
+        with self._lock:
+            self._file.write(line + '\n')
+
+
+class RecordingClient(object):
+    """Proxy for a boto3 client that records each API call."""
+    def __init__(self, client, service, recorder):
+        self._client = client
+        self._service = service
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr) or name.startswith(('get_', 'can_')):
+            return attr
+
+        def call(*args, **kwargs):
+            return self._recorder.record(
+                self._service, name, attr, *args, **kwargs)
+        return call
+
+
+class VirtualClock(object):
+    """Clock for replays, starting at the beginning of the recording.
+
+    Sleeping advances the virtual time immediately; with a speed-up, it also
+    waits the corresponding compressed real time.
+
+    Attributes:
+        origin (float): Epoch seconds at which the recording started.
+        offset (float): Virtual seconds elapsed since the origin.
+        speed (float): Real-time speed-up factor, or 0 to never wait.
+    """
+    def __init__(self, origin, speed=0):
+        self.origin = origin
+        self.offset = 0.0
+        self.speed = speed
+
+    def sleep(self, seconds):
+        """Advance the virtual time.
+
+        Args:
+            seconds (float): Virtual seconds to sleep.
+        """
+        self.offset += seconds
+        if self.speed:
+            time.sleep(seconds / float(self.speed))
+
+    def now(self):
+        """Get the current virtual time.
+
+        Returns:
+            datetime.datetime: The virtual time, in UTC.
+        """
+        return datetime.fromtimestamp(self.origin + self.offset, pytz.utc)
+
+
+class TraceReplayer(object):
+    """Replay a recorded trace against a virtual clock.
+
+    Each call is answered with the last response recorded for the same
+    operation and parameters at or before the current virtual time (or the
+    first one, if the call is earlier than any recording), falling back to
+    any parameters when the exact request was never recorded. The clock is
+    then advanced by the recorded latency. Replies therefore depend only on
+    when calls are made, so different polling strategies can be compared
+    against the same incident.
+
+    Attributes:
+        trace_path (str): Path of the trace file.
+        clock (VirtualClock): The replay's virtual clock.
+        calls (collections.Counter): Number of replayed calls per operation.
+
+    Example:
+        >>> replayer = TraceReplayer('incident.trace.gz', speed=60)
+        >>> aws_api = replayer.aws_api()
+    """
+    def __init__(self, trace_path, speed=0):
+        self.trace_path = trace_path
+        self.calls = collections.Counter()
+        self._events = collections.defaultdict(list)
+        with gzip.open(trace_path, 'rt') as f:
+            header = json.loads(next(f))
+            if header.get('version') != TRACE_VERSION:
+                raise ValueError('Unsupported trace version {} in {}'.format(
+                    header.get('version'), trace_path))
+            for line in f:
+                event = json.loads(line,
+                                   object_hook=emr.utils.json_object_hook)
+                key = (event['service'], event['operation'])
+                self._events[key].append(event)
+                self._events[key + (_params_key(event['params']),)] \
+                    .append(event)
+        self._starts = dict((k, [e['start'] for e in v])
+                            for k, v in self._events.items())
+        self.clock = VirtualClock(header['origin'], speed)
+
+    def aws_api(self):
+        """Create an AWSApi client answered from the trace.
+
+        Returns:
+            emr.utils.AWSApi: A client that never calls AWS.
+        """
+        return ReplayAWSApi(self)
+
+    def run_shell_command(self, cmd):
+        """Replay an AWS CLI command.
+
+        Args:
+            cmd (str): The shell command that would be executed.
+
+        Returns:
+            str: The recorded command output.
+        """
+        return self.replay('shell', shell_operation(cmd))
+
+    def replay(self, service, operation, params=None):
+        """Replay a call at the current virtual time.
+
+        Args:
+            service (str): Service name, e.g. 'emr' or 'shell'.
+            operation (str): Operation name, e.g. 'list_steps'.
+            params (dict): Optional request parameters.
+
+        Returns:
+            The recorded response.
+
+        Raises:
+            botocore.exceptions.ClientError: If the recorded call failed
+                with a ClientError.
+            Exception: The recorded exception (e.g. EndpointConnectionError
+                or CalledProcessError) if the call failed otherwise.
+            ValueError: If the operation was never recorded.
+        """
+        key = (service, operation, _params_key(redact(params or {})))
+        if key not in self._events:
+            key = key[:2]
+        if key not in self._events:
+            raise ValueError('No {}.{} calls recorded in {}'.format(
+                service, operation, self.trace_path))
+
+        index = bisect.bisect_right(self._starts[key], self.clock.offset)
+        event = self._events[key][max(0, index - 1)]
+        self.calls[key[:2]] += 1
+        self.clock.sleep(event['duration'])
+        if 'error' in event:
+            raise ClientError(event['error'], operation)
+        if 'exception' in event:
+            raise _replayed_exception(event['exception'], operation)
+        return event['response']
+
+
+class ReplayClient(object):
+    """Stand-in for a boto3 client that replays recorded calls."""
+    def __init__(self, replayer, service):
+        self._replayer = replayer
+        self._service = service
+
+    def __getattr__(self, name):
+        def call(**kwargs):
+            return self._replayer.replay(self._service, name, kwargs)
+        return call
+
+
+def _exception_info(service, e):
+    info = {'module': type(e).__module__, 'type': type(e).__name__}
+    if isinstance(e, subprocess.CalledProcessError):
+        info['returncode'] = e.returncode
+    elif service != 'shell':
+        # shell errors may carry the full command line and its arguments
+        info['message'] = str(e)
+    return info
+
+
+def _replayed_exception(info, operation):
+    message = info.get('message', '')
+    cls = None
+    if info['module'] in REPLAYED_EXCEPTION_MODULES:
+        cls = getattr(importlib.import_module(info['module']), info['type'],
+                      None)
+    if not (isinstance(cls, type) and issubclass(cls, Exception)):
+        return ReplayedError('{}.{}: {}'.format(
+            info['module'], info['type'], message))
+    if issubclass(cls, subprocess.CalledProcessError):
+        return cls(info.get('returncode'), operation)
+    if issubclass(cls, BotoCoreError):
+        # botocore errors format their message from keyword arguments
+        e = cls.__new__(cls)
+        Exception.__init__(e, message)
+        e.kwargs = {}
+        return e
+    return cls(message)
+
+
+def _params_key(params):
+    return json.dumps(params, sort_keys=True, default=emr.utils.json_default)
+
+
+class ReplayAWSApi(emr.utils.AWSApi):
+    """AWSApi client answered from a recorded trace.
+
+    Attributes:
+        replayer (TraceReplayer): The trace being replayed.
+    """
+    def __init__(self, replayer):
+        self.profile = None
+        self.step_cache = None
+        self.replayer = replayer
+        self.s3 = ReplayClient(replayer, 's3')
+        self.emr = ReplayClient(replayer, 'emr')
+
+    def run_command(self, cmd):
+        return self.replayer.run_shell_command(cmd)
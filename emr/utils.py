@@ -3,13 +3,19 @@ import json
 import logging
 import os
 import sys
+from datetime import datetime
 from os.path import dirname, join
 from subprocess import check_output
 
 import boto3
+import pytz
 import yaml
 from jinja2 import Template
 
+from emr.constants import ACTIVE_STEP_STATES, ALL_STEP_STATES
+
+EPOCH = datetime(1970, 1, 1, tzinfo=pytz.utc)
+
 
 class AWSApi(object):
     """AWS API client wrapper for EMR and S3 operations.
@@ -22,6 +28,8 @@ class AWSApi(object):
         session (boto3.Session): Boto3 session instance.
         s3 (boto3.client): S3 client instance.
         emr (boto3.client): EMR client instance.
+        step_cache (emr.step_cache.SharedStepCache): Optional cache of step
+            listings shared with other processes on the same host.
 
     Example:
         >>> api = AWSApi(profile='my-profile')
@@ -29,6 +37,7 @@ class AWSApi(object):
     """
     def __init__(self, profile=None):
         self.profile = profile
+        self.step_cache = None
         self.session = \
             boto3.Session(profile_name=profile) if profile else boto3.Session()
         self.s3 = self.session.client('s3')
@@ -69,48 +78,93 @@ class AWSApi(object):
         """
         return len(self.get_emr_cluster_with_name(cluster_name)) == 1
 
-    def list_running_cluster_instances(self, cluster_id):
+    def list_running_cluster_instances(self, cluster_id,
+                                       instance_group_types=None,
+                                       instance_fleet_type=None):
         """List all running instances for a given EMR cluster.
 
         Args:
             cluster_id (str): The ID of the EMR cluster.
+            instance_group_types (list): Optional instance group types to
+                filter by, e.g. ['MASTER']. Defaults to all groups.
+            instance_fleet_type (str): Optional instance fleet type to filter
+                by on instance-fleet clusters, e.g. 'MASTER'.
 
         Returns:
             dict: Response from EMR list_instances API containing
                 running instances.
         """
+        if instance_fleet_type:
+            return self.emr.list_instances(
+                ClusterId=cluster_id, InstanceStates=['RUNNING'],
+                InstanceFleetType=instance_fleet_type)
+        if instance_group_types:
+            return self.emr.list_instances(
+                ClusterId=cluster_id, InstanceStates=['RUNNING'],
+                InstanceGroupTypes=instance_group_types)
         return self.emr.list_instances(
             ClusterId=cluster_id, InstanceStates=['RUNNING'])
 
-    def list_cluster_steps(self, cluster_id, job_name, active_only=False):
+    def list_cluster_steps(self, cluster_id, job_name=None,
+                           active_only=False, use_cache=True):
         """List EMR cluster steps filtered by job name and state.
 
         Args:
             cluster_id (str): The ID of the EMR cluster.
-            job_name (str): The name of the job/step to filter by.
+            job_name (str): The name of the job/step to filter by. If None,
+                steps of every job are returned.
             active_only (bool): If True, only return PENDING and RUNNING
                 steps. If False, return all step states. Defaults to False.
+            use_cache (bool): If False, bypass the shared step cache, e.g.
+                when a stale listing could overshoot a limit. Defaults to
+                True.
 
         Returns:
-            list: A list of step dictionaries matching the job name.
+            list: A list of step dictionaries matching the job name, from
+                the first page of the EMR ListSteps response.
         """
-        if active_only:
-            states = ['PENDING', 'RUNNING']
+        states = ACTIVE_STEP_STATES if active_only else ALL_STEP_STATES
+
+        def fetch_steps():
+            return self.emr.list_steps(
+                ClusterId=cluster_id,
+                StepStates=states
+            )['Steps']
+
+        if self.step_cache and use_cache:
+            steps = self.step_cache.get(cluster_id, states, fetch_steps)
         else:
-            states = [
-                'PENDING',
-                'CANCEL_PENDING',
-                'RUNNING',
-                'COMPLETED',
-                'CANCELLED',
-                'FAILED',
-                'INTERRUPTED']
-
-        active_jobs = self.emr.list_steps(
-            ClusterId=cluster_id,
-            StepStates=states
-        )
-        return [s for s in active_jobs['Steps'] if s['Name'] == job_name]
+            steps = fetch_steps()
+        if job_name is None:
+            return steps
+        return [s for s in steps if s['Name'] == job_name]
+
+    def iter_cluster_steps(self, cluster_id, states=None):
+        """Iterate over every step on an EMR cluster, newest first.
+
+        Follows the ListSteps pagination marker lazily, so callers that stop
+        iterating early (e.g. once they reach a step they have already seen)
+        avoid fetching the remaining pages.
+
+        Args:
+            cluster_id (str): The ID of the EMR cluster.
+            states (list): Optional step states to filter by. Defaults to
+                all step states.
+
+        Yields:
+            dict: Step dictionaries in reverse order of creation.
+        """
+        kwargs = {
+            'ClusterId': cluster_id,
+            'StepStates': states or ALL_STEP_STATES
+        }
+        while True:
+            response = self.emr.list_steps(**kwargs)
+            for step in response['Steps']:
+                yield step
+            if not response.get('Marker'):
+                break
+            kwargs['Marker'] = response['Marker']
 
     def terminate_clusters(self, cluster_name, config):
         """Terminate all active EMR clusters with the specified name.
@@ -136,7 +190,18 @@ class AWSApi(object):
             print('Terminating cluster: {}\n'.format(json.dumps(cluster_info)))
             term_command = terminate_template.render(config)
             print('\n{}\n'.format(term_command))
-            run_shell_command(term_command)
+            self.run_command(term_command)
+
+    def run_command(self, cmd):
+        """Execute an AWS CLI command on behalf of this client.
+
+        Args:
+            cmd (str): The AWS CLI command to execute.
+
+        Returns:
+            bytes: The command output as bytes.
+        """
+        return run_shell_command(cmd)
 
 
 def run_shell_command(cmd):
@@ -173,12 +238,31 @@ def tokenize_emr_step_args(arguments):
     return '[{}]'.format(','.join(arguments.split()))
 
 
+def resolve_config_path(file_name, env_key):
+    """Resolve the path of a configuration file.
+
+    Args:
+        file_name: Name of the configuration file, relative to this module,
+            or an absolute path.
+        env_key: Environment variable key to check for custom file path, or
+            None to always use file_name.
+
+    Returns:
+        str: The custom file path if the environment variable is set,
+            otherwise the file path relative to this module.
+    """
+    module_dir = dirname(__file__)
+    return (env_key and os.getenv(env_key, None)) or \
+        join(module_dir, file_name)
+
+
 def load_config(file_name, env_key):
     """Load a YAML configuration file.
 
     Args:
         file_name: Name of the configuration file to load.
-        env_key: Environment variable key to check for custom file path.
+        env_key: Environment variable key to check for custom file path, or
+            None to always use file_name.
 
     Returns:
         dict: Parsed YAML configuration, or empty dict if file cannot be read.
@@ -191,8 +275,7 @@ def load_config(file_name, env_key):
     logging.getLogger("botocore").setLevel(logging.WARNING)
     logger = logging.getLogger(__name__)
 
-    module_dir = dirname(__file__)
-    file_path = os.getenv(env_key, None) or join(module_dir, file_name)
+    file_path = resolve_config_path(file_name, env_key)
 
     try:
         logger.info('Loading configuration from file: {}'.format(file_path))
@@ -203,6 +286,50 @@ def load_config(file_name, env_key):
         return dict()
 
 
+def to_epoch_seconds(timestamp):
+    """Convert a timezone-aware datetime to seconds since the Unix epoch.
+
+    Args:
+        timestamp (datetime.datetime): A timezone-aware datetime, as returned
+            in EMR step timelines.
+
+    Returns:
+        float: Seconds since 1970-01-01T00:00:00Z.
+    """
+    return (timestamp - EPOCH).total_seconds()
+
+
+def json_default(value):
+    """Encode datetimes for json.dumps, as used for cached API responses.
+
+    Args:
+        value: A value json cannot serialize natively.
+
+    Returns:
+        dict: A tagged ISO-8601 representation of a datetime.
+
+    Raises:
+        TypeError: If the value is not a datetime.
+    """
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    raise TypeError('{} is not JSON serializable'.format(type(value)))
+
+
+def json_object_hook(obj):
+    """Decode datetimes encoded by json_default, for json.loads.
+
+    Args:
+        obj (dict): A decoded JSON object.
+
+    Returns:
+        The datetime for a tagged object, otherwise the object unchanged.
+    """
+    if len(obj) == 1 and '__datetime__' in obj:
+        return datetime.fromisoformat(obj['__datetime__'])
+    return obj
+
+
 def log_assertion(condition, log_msg, description):
     """Log an assertion and raise ValueError if condition is False.
 
@@ -0,0 +1,205 @@
+from __future__ import print_function
+import click
+import json
+import logging
+import logging.config
+import time
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+import emr.utils
+from emr.constants import NON_TERMINAL_STEP_STATES, TERMINAL_STEP_STATES
+
+# ListSteps accepts at most 10 step ids per request
+MAX_STEP_IDS = 10
+
+
+class StepWatcher(object):
+    """Track every step on an EMR cluster and report state changes.
+
+    Each tick pages through ListSteps newest first only until it reaches
+    steps created at or before the high-water mark of the previous tick, and
+    refreshes the steps still in flight by id. Steps are evicted as soon as
+    their terminal state has been reported, so memory is bounded by the
+    number of active steps rather than the cluster's step history.
+
+    Attributes:
+        aws_api (emr.utils.AWSApi): Client used to list cluster steps.
+        cluster_id (str): The ID of the EMR cluster.
+        active (dict): Last reported state of each in-flight step, by id.
+        high_water_mark (datetime.datetime): Creation time of the newest
+            step seen so far.
+
+    Example:
+        >>> watcher = StepWatcher(AWSApi(), 'j-2MTD0ERMUNR2A')
+        >>> for change in watcher.tick():
+        ...     print(change)
+    """
+    def __init__(self, aws_api, cluster_id):
+        self.aws_api = aws_api
+        self.cluster_id = cluster_id
+        self.active = {}
+        self.high_water_mark = None
+        self._seen_at_mark = set()
+
+    def tick(self):
+        """Poll the cluster once and return the step state changes.
+
+        The first tick lists only the active steps and reports each of
+        them; steps that had already finished before the watcher started
+        are not reported.
+
+        The watcher's state is only updated once every call has succeeded,
+        so a tick that raises can be retried.
+
+        Returns:
+            list: Change dictionaries with keys 'clusterId', 'stepId',
+                'name', 'previousState', 'state' and 'createdTime'.
+        """
+        if self.high_water_mark is None:
+            marked_steps, new_steps = self._initial_steps()
+        else:
+            new_steps = marked_steps = self._new_steps()
+        changes = [self._change(s, None) for s in new_steps]
+
+        new_ids = set(c['stepId'] for c in changes)
+        for step_info in self._active_steps(new_ids):
+            previous = self.active[step_info['Id']]
+            if step_info['Status']['State'] != previous:
+                changes.append(self._change(step_info, previous))
+
+        self._advance_mark(marked_steps)
+        for change in changes:
+            if change['state'] in TERMINAL_STEP_STATES:
+                self.active.pop(change['stepId'], None)
+            else:
+                self.active[change['stepId']] = change['state']
+        return changes
+
+    def _initial_steps(self):
+        # read the high-water mark before the active steps, so a step created
+        # in between is reported again rather than missed
+        newest = next(self.aws_api.iter_cluster_steps(self.cluster_id), None)
+        return [newest] if newest is not None else [], \
+            list(self.aws_api.iter_cluster_steps(
+                self.cluster_id, NON_TERMINAL_STEP_STATES))
+
+    def _new_steps(self):
+        new_steps = []
+        for step_info in self.aws_api.iter_cluster_steps(self.cluster_id):
+            created = step_info['Status']['Timeline']['CreationDateTime']
+            if created < self.high_water_mark:
+                break
+            if step_info['Id'] in self.active:
+                continue
+            if created == self.high_water_mark and \
+                    step_info['Id'] in self._seen_at_mark:
+                continue
+            new_steps.append(step_info)
+        return new_steps
+
+    def _advance_mark(self, steps):
+        for step_info in steps:
+            created = step_info['Status']['Timeline']['CreationDateTime']
+            if self.high_water_mark is None or created > self.high_water_mark:
+                self.high_water_mark = created
+                self._seen_at_mark = set()
+            if created == self.high_water_mark:
+                self._seen_at_mark.add(step_info['Id'])
+
+    def _active_steps(self, skip_ids):
+        step_ids = [i for i in self.active if i not in skip_ids]
+        for start in range(0, len(step_ids), MAX_STEP_IDS):
+            response = self.aws_api.emr.list_steps(
+                ClusterId=self.cluster_id,
+                StepIds=step_ids[start:start + MAX_STEP_IDS])
+            for step_info in response['Steps']:
+                yield step_info
+
+    def _change(self, step_info, previous_state):
+        created = step_info['Status']['Timeline']['CreationDateTime']
+        return {
+            'clusterId': self.cluster_id,
+            'stepId': step_info['Id'],
+            'name': step_info['Name'],
+            'previousState': previous_state,
+            'state': step_info['Status']['State'],
+            'createdTime': created.strftime("%Y-%m-%dT%H-%M-%S")
+        }
+
+
+def watch_clusters(watchers, interval=60, max_ticks=None):
+    """Poll a set of step watchers and yield state changes as they happen.
+
+    AWS errors of one watcher (e.g. throttling or a dropped connection,
+    once botocore's own retries are exhausted) are logged, and the watcher
+    is polled again on the next tick.
+
+    Args:
+        watchers (list): StepWatcher instances, one per cluster.
+        interval (int): Seconds to sleep between ticks.
+        max_ticks (int): Optional number of ticks after which to stop.
+            Defaults to watching forever.
+
+    Yields:
+        dict: Step state change dictionaries.
+    """
+    ticks = 0
+    while max_ticks is None or ticks < max_ticks:
+        if ticks:
+            time.sleep(interval)
+        for watcher in watchers:
+            try:
+                changes = watcher.tick()
+            except (BotoCoreError, ClientError) as e:
+                logging.warning(
+                    'clusterId={}, action=watch-steps, exception={}, '
+                    'error={}'.format(watcher.cluster_id, type(e).__name__, e))
+                continue
+            for change in changes:
+                yield change
+        ticks += 1
+
+
+@click.command()
+@click.option('--cluster-name',
+              'cluster_names',
+              multiple=True,
+              required=True,
+              help='Name of an EMR cluster to watch; may be repeated.')
+@click.option('--profile',
+              default='',
+              help='Optional AWS profile credentials to be used.')
+@click.option('--interval',
+              default=60,
+              help='Seconds between polls of each cluster.')
+def watch(cluster_names, profile, interval):
+    aws_api = emr.utils.AWSApi(profile) if profile else emr.utils.AWSApi()
+
+    watchers = []
+    for cluster_name in cluster_names:
+        clust_info = aws_api.get_emr_cluster_with_name(cluster_name)
+        log_msg = ('cluster={}, action=get-clusters, count={}, '
+                   'clusterList={}'.format(cluster_name, len(clust_info),
+                                           json.dumps(clust_info)))
+        emr.utils.log_assertion(
+            len(clust_info) == 1,
+            log_msg,
+            'Expected 1 but found {} running clusters with name {}'.format(
+                len(clust_info),
+                cluster_name))
+        watchers.append(StepWatcher(aws_api, clust_info[0]['id']))
+
+    for change in watch_clusters(watchers, interval):
+        logging.info(
+            'clusterId={}, action=step-state-change, stepId={}, name={}, '
+            'previousState={}, state={}, createdTime={}'.format(
+                change['clusterId'], change['stepId'], change['name'],
+                change['previousState'], change['state'],
+                change['createdTime']))
+
+
+if __name__ == '__main__':
+    log_config = emr.utils.load_config('logging.yml', 'LOG_CFG')
+    logging.config.dictConfig(log_config)
+    watch()
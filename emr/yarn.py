@@ -0,0 +1,116 @@
+import json
+
+from six.moves.urllib.parse import urlencode
+from six.moves.urllib.request import urlopen
+
+import emr.utils
+
+RESOURCE_MANAGER_PORT = 8088
+
+YARN_FAILED_STATES = ['FAILED', 'KILLED']
+
+
+class YarnProgressProbe(object):
+    """Poll the YARN ResourceManager for the progress of a Spark step.
+
+    The step's YARN application is found by its name, which the Spark step
+    template sets to the job name, among the Spark applications started
+    since the step was created. The ResourceManager address is resolved
+    from the cluster's master instance on first use.
+
+    Attributes:
+        aws_api (emr.utils.AWSApi): Client used to find the master node.
+        cluster_id (str): The ID of the EMR cluster.
+        job_name (str): The name of the EMR step/job.
+        resource_manager (str): Base URL of the ResourceManager REST API,
+            or None until resolved.
+        timeout (float): Seconds to wait for each REST API response.
+        application_id (str): The step's YARN application ID, or None until
+            resolved.
+        step_id (str): The ID of the step the application belongs to.
+        unavailable (bool): Whether the cluster was found to have no running
+            master instance, after which the probe stops polling.
+
+    Example:
+        >>> probe = YarnProgressProbe(AWSApi(), 'j-2MTD0ERMUNR2A', 'WordCount')
+        >>> probe.poll(step_info)
+        {'applicationId': 'application_1514764800000_0001', ...}
+    """
+    def __init__(self, aws_api, cluster_id, job_name, resource_manager=None,
+                 timeout=10):
+        self.aws_api = aws_api
+        self.cluster_id = cluster_id
+        self.job_name = job_name
+        self.resource_manager = resource_manager
+        self.timeout = timeout
+        self.application_id = None
+        self.step_id = None
+        self.unavailable = False
+
+    def poll(self, step_info):
+        """Get the YARN progress of a running step.
+
+        Args:
+            step_info (dict): Step dictionary from the EMR ListSteps API.
+
+        Returns:
+            dict: A dictionary with keys 'applicationId', 'state',
+                'finalStatus', 'progress' and 'runningContainers', or None
+                if the application has not been submitted to YARN yet or the
+                probe is unavailable.
+        """
+        if self.unavailable:
+            return None
+        if step_info['Id'] != self.step_id:
+            self.step_id, self.application_id = step_info['Id'], None
+
+        if self.application_id is None:
+            app = self._find_application(step_info)
+        else:
+            app = self._get_json('/ws/v1/cluster/apps/{}'.format(
+                self.application_id))['app']
+        if app is None:
+            return None
+
+        self.application_id = app['id']
+        return {
+            'applicationId': app['id'],
+            'state': app['state'],
+            'finalStatus': app['finalStatus'],
+            'progress': app['progress'],
+            'runningContainers': app.get('runningContainers', 0)
+        }
+
+    def _find_application(self, step_info):
+        created = step_info['Status']['Timeline']['CreationDateTime']
+        response = self._get_json('/ws/v1/cluster/apps?{}'.format(urlencode({
+            'applicationTypes': 'SPARK',
+            'startedTimeBegin':
+                int(emr.utils.to_epoch_seconds(created) * 1000)
+        })))
+        apps = [a for a in ((response.get('apps') or {}).get('app') or [])
+                if a['name'] == self.job_name]
+        return max(apps, key=lambda a: a['startedTime']) if apps else None
+
+    def _get_json(self, path):
+        if self.resource_manager is None:
+            self.resource_manager = self._resolve_resource_manager()
+        response = urlopen(self.resource_manager + path, timeout=self.timeout)
+        try:
+            return json.loads(response.read().decode('utf-8'))
+        finally:
+            response.close()
+
+    def _resolve_resource_manager(self):
+        instances = self.aws_api.list_running_cluster_instances(
+            self.cluster_id, instance_group_types=['MASTER'])['Instances']
+        if not instances:
+            # instance-fleet clusters are not matched by instance group type
+            instances = self.aws_api.list_running_cluster_instances(
+                self.cluster_id, instance_fleet_type='MASTER')['Instances']
+        if not instances:
+            self.unavailable = True
+            raise ValueError('No running master instance found for cluster '
+                             '{}'.format(self.cluster_id))
+        return 'http://{}:{}'.format(
+            instances[0]['PrivateIpAddress'], RESOURCE_MANAGER_PORT)
@@ -0,0 +1,175 @@
+import pytest
+import threading
+import time
+from mock import Mock
+
+import emr.admission
+from emr.admission import AdmissionController, get_controller
+
+
+@pytest.fixture(autouse=True)
+def clear_controllers():
+    emr.admission._controllers.clear()
+
+
+@pytest.fixture
+def make_controller(tmpdir):
+    def make(aws_api, max_active_steps, refresh_interval=30):
+        return AdmissionController(
+            aws_api, 'cl-359', max_active_steps, refresh_interval,
+            directory=str(tmpdir), poll_interval=0.005)
+    return make
+
+
+@pytest.fixture
+def aws_api():
+    api = Mock()
+    api.list_cluster_steps.return_value = []
+    return api
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, 'timed out waiting for condition'
+        time.sleep(0.005)
+
+
+def test_admits_immediately_below_limit(aws_api, make_controller):
+    controller = make_controller(aws_api, 2)
+
+    with controller.admit() as admission:
+        pass
+
+    assert admission.submitted_at is not None
+    aws_api.list_cluster_steps.assert_called_once_with(
+        'cl-359', active_only=True, use_cache=False)
+    assert controller.stats()['admitted'] == 1
+
+
+def test_waits_until_active_steps_drop_below_limit(aws_api, make_controller):
+    aws_api.list_cluster_steps.side_effect = \
+        [['s-1', 's-2'], ['s-1', 's-2'], ['s-2']]
+    controller = make_controller(aws_api, 2, refresh_interval=0.01)
+
+    controller.admit()
+
+    assert aws_api.list_cluster_steps.call_count == 3
+    assert controller.stats()['inFlight'] == 2
+
+
+def test_counts_admitted_steps_until_listed(aws_api, make_controller):
+    controller = make_controller(aws_api, 1, refresh_interval=60)
+    with controller.admit():
+        pass
+
+    # the submitted step is in flight although no listing has shown it yet
+    assert controller.stats()['inFlight'] == 1
+
+
+def test_admits_higher_priority_first(aws_api, make_controller):
+    aws_api.list_cluster_steps.return_value = ['s-1']
+    controller = make_controller(aws_api, 1, refresh_interval=0.01)
+    order = []
+
+    def submit(priority):
+        with controller.admit(priority):
+            order.append(priority)
+
+    threads = []
+    for priority in (0, 5, 1):
+        threads.append(threading.Thread(target=submit, args=(priority,)))
+        threads[-1].start()
+        wait_for(lambda: controller.queue_depth() == len(threads))
+
+    aws_api.list_cluster_steps.return_value = []
+    for thread in threads:
+        thread.join()
+
+    assert order == [5, 1, 0]
+    stats = controller.stats()
+    assert stats['queueDepth'] == 0
+    assert stats['admitted'] == 3
+    assert stats['maxWaitSeconds'] >= stats['meanWaitSeconds'] > 0
+
+
+def test_failed_submission_releases_slot(aws_api, make_controller):
+    controller = make_controller(aws_api, 1, refresh_interval=60)
+
+    with pytest.raises(ValueError):
+        with controller.admit():
+            raise ValueError('StepIds not found in terminal output')
+
+    assert controller.stats()['inFlight'] == 0
+
+
+def test_failed_listing_leaves_queue(aws_api, make_controller):
+    aws_api.list_cluster_steps.side_effect = [RuntimeError('Throttling'), []]
+    controller = make_controller(aws_api, 1, refresh_interval=60)
+
+    with pytest.raises(RuntimeError):
+        controller.admit()
+    assert controller.queue_depth() == 0
+
+    with controller.admit():
+        pass
+    assert controller.stats()['admitted'] == 1
+
+
+def test_stats_do_not_wait_for_listing(aws_api, make_controller):
+    listing, release = threading.Event(), threading.Event()
+
+    def list_steps(cluster_id, active_only, use_cache):
+        listing.set()
+        release.wait(5)
+        return []
+    aws_api.list_cluster_steps.side_effect = list_steps
+    controller = make_controller(aws_api, 1)
+    thread = threading.Thread(target=controller.admit)
+    thread.start()
+
+    assert listing.wait(5)
+    assert controller.stats()['queueDepth'] == 1
+    release.set()
+    thread.join(5)
+    assert controller.stats()['admitted'] == 1
+
+
+def test_processes_share_one_queue(aws_api, make_controller):
+    # two controllers on one directory stand for two CLI processes
+    first, second = make_controller(aws_api, 1), make_controller(aws_api, 1)
+    admission = first.admit()
+    admitted = []
+    thread = threading.Thread(target=lambda: admitted.append(second.admit()))
+    thread.start()
+
+    wait_for(lambda: second.queue_depth() == 1)
+    time.sleep(0.05)
+    assert admitted == []
+    admission.release()
+    thread.join(5)
+
+    assert len(admitted) == 1
+    assert first.stats()['inFlight'] == 1
+
+
+def test_queued_submissions_of_dead_processes_expire(aws_api,
+                                                     make_controller):
+    controller = make_controller(aws_api, 1)
+    controller.lock_timeout = 0.05
+    with controller._connect() as conn:
+        conn.execute("INSERT INTO queue VALUES ('dead', 9, 0, 0)")
+
+    with controller.admit():
+        pass
+
+    assert controller.queue_depth() == 0
+
+
+def test_controllers_are_shared_per_cluster(aws_api, tmpdir):
+    directory = str(tmpdir)
+    controller = get_controller(aws_api, 'cl-359', 2, directory)
+
+    assert get_controller(aws_api, 'cl-359', 3, directory) is controller
+    assert controller.max_active_steps == 3
+    assert get_controller(aws_api, 'cl-637', 2, directory) is not controller
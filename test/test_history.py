@@ -0,0 +1,110 @@
+import pytest
+import pytz
+from datetime import datetime, timedelta
+from mock import Mock
+
+from emr.history import StepHistory, next_poll_interval, percentile
+
+
+def make_step(step_id, name, state, created_minute, minutes=None):
+    created = datetime(2018, 1, 1, 0, created_minute, 0, 0) \
+        .replace(tzinfo=pytz.utc)
+    timeline = {'CreationDateTime': created}
+    if minutes is not None:
+        timeline['StartDateTime'] = created
+        timeline['EndDateTime'] = created + timedelta(minutes=minutes)
+    return {
+        'Id': step_id,
+        'Name': name,
+        'Status': {'State': state, 'Timeline': timeline}
+    }
+
+
+@pytest.fixture
+def history():
+    step_history = StepHistory(':memory:')
+    yield step_history
+    step_history.close()
+
+
+@pytest.fixture
+def aws_api():
+    return Mock()
+
+
+def test_sync_stores_only_completed_steps(history, aws_api):
+    aws_api.iter_cluster_steps.return_value = iter([
+        make_step('s-4', 'WordCount', 'RUNNING', 4),
+        make_step('s-3', 'WordCount', 'FAILED', 3, minutes=1),
+        make_step('s-2', 'WordCount', 'COMPLETED', 2, minutes=10),
+        make_step('s-1', 'Other', 'COMPLETED', 1, minutes=5)
+    ])
+
+    assert history.sync(aws_api, 'cl-359', 'Sandbox') == 2
+    assert history.durations('WordCount') == [600.0]
+    assert history.durations('Other', 'Sandbox') == [300.0]
+    assert history.durations('Other', 'Production') == []
+
+
+def test_sync_resumes_from_oldest_active_step(history, aws_api):
+    aws_api.iter_cluster_steps.return_value = iter([
+        make_step('s-3', 'WordCount', 'PENDING', 3),
+        make_step('s-2', 'WordCount', 'RUNNING', 2),
+        make_step('s-1', 'WordCount', 'COMPLETED', 1, minutes=10)
+    ])
+    history.sync(aws_api, 'cl-359', 'Sandbox')
+
+    # the running steps complete; older steps should not be paged through
+    paged = []
+    steps = [
+        make_step('s-4', 'WordCount', 'COMPLETED', 4, minutes=3),
+        make_step('s-3', 'WordCount', 'COMPLETED', 3, minutes=2),
+        make_step('s-2', 'WordCount', 'COMPLETED', 2, minutes=1),
+        make_step('s-1', 'WordCount', 'COMPLETED', 1, minutes=10),
+        make_step('s-0', 'WordCount', 'COMPLETED', 0, minutes=10)
+    ]
+
+    def iter_steps(cluster_id):
+        for step in steps:
+            paged.append(step['Id'])
+            yield step
+    aws_api.iter_cluster_steps.side_effect = iter_steps
+
+    assert history.sync(aws_api, 'cl-359', 'Sandbox') == 3
+    assert history.durations('WordCount') == [60.0, 120.0, 180.0, 600.0]
+    assert paged == ['s-4', 's-3', 's-2', 's-1']
+
+
+def test_percentiles_for_job(history):
+    for i in range(1, 21):
+        history.record('cl-359', 'Sandbox',
+                       make_step('s-{}'.format(i), 'WordCount', 'COMPLETED',
+                                 i, minutes=i))
+
+    stats = history.percentiles('WordCount')
+
+    assert stats['count'] == 20
+    assert stats['p50'] == pytest.approx(630.0)
+    assert stats['p95'] == pytest.approx(1143.0)
+    assert history.predict_runtime('WordCount') == stats['p50']
+    assert history.predict_runtime('Unknown') is None
+
+
+def test_percentile_interpolates_between_ranks():
+    assert percentile([], 50) is None
+    assert percentile([10.0], 95) == 10.0
+    assert percentile([10.0, 20.0], 50) == 15.0
+
+
+def test_next_poll_interval_sleeps_until_near_predicted_end():
+    # no prediction or unknown elapsed time uses the default interval
+    assert next_poll_interval(None, 0) == 60
+    assert next_poll_interval(3600, None) == 60
+
+    # wake up with a 10% lead before the predicted end
+    assert next_poll_interval(3600, 0) == 3240
+    assert next_poll_interval(3600, 3000) == 240
+
+    # never sleep past the job timeout, or less than the default
+    assert next_poll_interval(3600, 0, job_timeout=30) == 1800
+    assert next_poll_interval(3600, 4000) == 60
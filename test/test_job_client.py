@@ -1,10 +1,14 @@
 import copy
+import logging
 import textwrap
 import pytest
 import pytz
+import sqlite3
 from datetime import datetime
+from botocore.exceptions import ClientError
 from mock import call
 
+import emr.status
 from emr.job_client import handle_job_request
 
 
@@ -281,3 +285,321 @@ def test_cluster_job_not_added_conditions(config,
         's3://us-east-1.elasticmapreduce/samples/wordcount/'
     handle_job_request(config)
     assert shell_function.call_count == 1
+
+
+def test_polls_near_predicted_runtime_from_history(config,
+                                                   step_info,
+                                                   aws_api,
+                                                   time_sleep,
+                                                   fixed_datetime,
+                                                   shell_function,
+                                                   mocker):
+    history = mocker.patch('emr.history.StepHistory', autospec=True)
+    history.return_value.predict_runtime.return_value = 1800
+    config['poll_cluster'] = True
+    config['history_db'] = 'steps.db'
+    step_info[0]['Status']['State'] = 'COMPLETED'
+    aws_api.return_value.list_cluster_steps.return_value = step_info
+
+    handle_job_request(config)
+
+    # the first poll waits until shortly before the predicted end
+    time_sleep.assert_called_once_with(1620)
+    history.return_value.sync.assert_called_once_with(
+        aws_api.return_value, 'cl-359', 'Sandbox')
+    history.return_value.record.assert_called_once_with(
+        'cl-359', 'Sandbox', step_info[0])
+
+
+def test_polls_at_default_interval_when_history_sync_fails(config,
+                                                           step_info,
+                                                           aws_api,
+                                                           time_sleep,
+                                                           fixed_datetime,
+                                                           shell_function,
+                                                           mocker):
+    history = mocker.patch('emr.history.StepHistory', autospec=True)
+    history.return_value.sync.side_effect = \
+        sqlite3.OperationalError('database is locked')
+    config['poll_cluster'] = True
+    config['history_db'] = 'steps.db'
+    step_info[0]['Status']['State'] = 'COMPLETED'
+    aws_api.return_value.list_cluster_steps.return_value = step_info
+
+    handle_job_request(config)
+
+    time_sleep.assert_called_once_with(60)
+    assert history.return_value.record.call_count == 0
+    assert history.return_value.close.call_count == 1
+
+
+def test_closes_history_when_job_fails(config,
+                                       step_info,
+                                       aws_api,
+                                       time_sleep,
+                                       fixed_datetime,
+                                       shell_function,
+                                       mocker):
+    history = mocker.patch('emr.history.StepHistory', autospec=True)
+    history.return_value.predict_runtime.return_value = None
+    config['poll_cluster'] = True
+    config['history_db'] = 'steps.db'
+    step_info[0]['Status']['State'] = 'FAILED'
+    aws_api.return_value.list_cluster_steps.return_value = step_info
+
+    with pytest.raises(ValueError):
+        handle_job_request(config)
+
+    assert history.return_value.record.call_count == 0
+    assert history.return_value.close.call_count == 1
+
+
+def test_serves_status_while_polling(config,
+                                     step_info,
+                                     aws_api,
+                                     time_sleep,
+                                     fixed_datetime,
+                                     shell_function,
+                                     mocker):
+    server = mocker.patch('emr.status.StatusServer', autospec=True)
+    server.return_value.port = 8080
+    config['poll_cluster'] = True
+    config['status_port'] = 8080
+    job_response = copy.deepcopy(step_info[0])
+    job_response['Status']['State'] = 'FAILED'
+    aws_api.return_value.list_cluster_steps.side_effect = \
+        [step_info, [job_response]]
+
+    with pytest.raises(ValueError):
+        handle_job_request(config)
+
+    # the server is stopped even when polling fails
+    status = server.call_args[0][0]
+    assert server.call_args[0][1] == 8080
+    assert server.return_value.start.call_count == 1
+    assert server.return_value.stop.call_count == 1
+    snapshot = status.snapshot()
+    assert snapshot['polls'] == 2
+    assert snapshot['apiCalls'] == 2
+    assert snapshot['step']['state'] == 'FAILED'
+
+
+def test_polls_without_status_server_when_port_taken(config,
+                                                     step_info,
+                                                     aws_api,
+                                                     time_sleep,
+                                                     fixed_datetime,
+                                                     shell_function,
+                                                     mocker):
+    server = mocker.patch('emr.status.StatusServer', autospec=True)
+    server.side_effect = OSError(98, 'Address already in use')
+    config['poll_cluster'] = True
+    config['status_port'] = 8080
+    job_response = copy.deepcopy(step_info[0])
+    job_response['Status']['State'] = 'COMPLETED'
+    aws_api.return_value.list_cluster_steps.return_value = [job_response]
+
+    handle_job_request(config)
+
+    assert shell_function.call_count == 1
+    assert aws_api.return_value.list_cluster_steps.call_count == 1
+
+
+def test_attaches_shared_step_cache(config,
+                                    step_info,
+                                    aws_api,
+                                    time_sleep,
+                                    fixed_datetime,
+                                    shell_function,
+                                    tmpdir):
+    config['shared_step_cache'] = str(tmpdir)
+    config['step_cache_ttl'] = 45
+
+    handle_job_request(config)
+
+    step_cache = aws_api.return_value.step_cache
+    assert step_cache.directory == str(tmpdir)
+    assert step_cache.ttl == 45
+
+
+def test_waits_for_admission_before_submitting(config,
+                                               aws_api,
+                                               shell_function,
+                                               mocker,
+                                               tmpdir):
+    mocker.patch.dict('emr.admission._controllers', clear=True)
+    aws_api.return_value.list_cluster_steps.return_value = []
+    config['max_active_steps'] = 2
+    config['admission_dir'] = str(tmpdir)
+
+    handle_job_request(config)
+
+    # the admission listing bypasses the shared step cache
+    aws_api.return_value.list_cluster_steps.assert_called_once_with(
+        'cl-359', active_only=True, use_cache=False)
+    assert tmpdir.join('cl-359.db').check()
+    assert shell_function.call_count == 1
+
+
+def test_fails_on_yarn_failure_before_step_state(config,
+                                                 step_info,
+                                                 aws_api,
+                                                 time_sleep,
+                                                 fixed_datetime,
+                                                 shell_function,
+                                                 mocker):
+    probe = mocker.patch('emr.yarn.YarnProgressProbe', autospec=True)
+    probe.return_value.poll.side_effect = [
+        None,
+        {'applicationId': 'application_1', 'state': 'FINISHED',
+         'finalStatus': 'FAILED', 'progress': 100.0, 'runningContainers': 0}
+    ]
+    config['poll_cluster'] = True
+    config['yarn_progress'] = True
+    aws_api.return_value.list_cluster_steps.return_value = step_info
+
+    with pytest.raises(ValueError) as excinfo:
+        handle_job_request(config)
+
+    # the EMR step is still RUNNING when YARN reports the failure
+    assert str(excinfo.value) == 'Job in invalid YARN state FAILED'
+    assert aws_api.return_value.list_cluster_steps.call_count == 2
+
+
+def test_keeps_polling_when_yarn_probe_is_throttled(config,
+                                                    step_info,
+                                                    aws_api,
+                                                    time_sleep,
+                                                    fixed_datetime,
+                                                    shell_function,
+                                                    mocker):
+    probe = mocker.patch('emr.yarn.YarnProgressProbe', autospec=True)
+    probe.return_value.poll.side_effect = ClientError(
+        {'Error': {'Code': 'ThrottlingException'}}, 'ListInstances')
+    config['poll_cluster'] = True
+    config['yarn_progress'] = True
+    completed = copy.deepcopy(step_info[0])
+    completed['Status']['State'] = 'COMPLETED'
+    aws_api.return_value.list_cluster_steps.side_effect = \
+        [step_info, [completed]]
+
+    handle_job_request(config)
+
+    assert probe.return_value.poll.call_count == 1
+
+
+def make_attempt(step_info, step_id, state, day=1):
+    step = copy.deepcopy(step_info[0])
+    step['Id'] = step_id
+    step['Status']['State'] = state
+    step['Status']['Timeline']['CreationDateTime'] = \
+        datetime(2018, 1, day, 0, 0, 0, 0).replace(tzinfo=pytz.utc)
+    return step
+
+
+def test_resubmits_interrupted_step(config,
+                                    step_info,
+                                    aws_api,
+                                    time_sleep,
+                                    fixed_datetime,
+                                    shell_function,
+                                    mocker):
+    attempt_status = mocker.spy(emr.status.PollStatus, 'record_attempt')
+    config['poll_cluster'] = True
+    config['retry_states'] = 'interrupted,cancelled'
+    config['max_attempts'] = 2
+    config['retry_backoff'] = 30
+    interrupted = make_attempt(step_info, 's-648', 'INTERRUPTED')
+    completed = make_attempt(step_info, 's-649', 'COMPLETED', day=2)
+
+    # the interrupted step is listed once more before the new step shows up
+    aws_api.return_value.list_cluster_steps.side_effect = \
+        [[interrupted], [interrupted], [interrupted, completed]]
+
+    handle_job_request(config)
+
+    # the same rendered command is submitted again after the backoff
+    assert shell_function.call_count == 2
+    assert shell_function.call_args_list[0] == shell_function.call_args_list[1]
+    assert time_sleep.call_args_list == \
+        [call(60), call(30), call(60), call(60)]
+    assert aws_api.return_value.terminate_clusters.call_count == 1
+    # both attempts are recorded, including the completed one
+    assert [(c[0][1]['attempt'], c[0][1]['stepId'], c[0][1]['state'])
+            for c in attempt_status.call_args_list] == \
+        [(1, 's-648', 'INTERRUPTED'), (2, 's-649', 'COMPLETED')]
+
+
+def test_fails_when_retry_attempts_exhausted(config,
+                                             step_info,
+                                             aws_api,
+                                             time_sleep,
+                                             fixed_datetime,
+                                             shell_function,
+                                             mocker):
+    attempt_status = mocker.spy(emr.status.PollStatus, 'record_attempt')
+    config['poll_cluster'] = True
+    config['retry_states'] = ['FAILED']
+    config['max_attempts'] = 2
+    first = make_attempt(step_info, 's-648', 'FAILED')
+    second = make_attempt(step_info, 's-649', 'FAILED', day=2)
+    aws_api.return_value.list_cluster_steps.side_effect = \
+        [[first], [first, second]]
+
+    with pytest.raises(ValueError) as excinfo:
+        handle_job_request(config)
+
+    assert str(excinfo.value) == 'Job in invalid state FAILED'
+    assert shell_function.call_count == 2
+    assert [(c[0][1]['attempt'], c[0][1]['stepId'], c[0][1]['state'])
+            for c in attempt_status.call_args_list] == \
+        [(1, 's-648', 'FAILED'), (2, 's-649', 'FAILED')]
+
+
+def test_interrupted_step_fails_without_retry_policy(config,
+                                                     step_info,
+                                                     aws_api,
+                                                     time_sleep,
+                                                     fixed_datetime,
+                                                     shell_function):
+    config['poll_cluster'] = True
+    aws_api.return_value.list_cluster_steps.return_value = \
+        [make_attempt(step_info, 's-648', 'INTERRUPTED')]
+
+    with pytest.raises(ValueError) as excinfo:
+        handle_job_request(config)
+
+    assert str(excinfo.value) == 'Job in invalid state INTERRUPTED'
+    assert shell_function.call_count == 1
+
+
+def test_disables_retries_without_submission(config,
+                                             step_info,
+                                             aws_api,
+                                             time_sleep,
+                                             fixed_datetime,
+                                             shell_function,
+                                             caplog):
+    caplog.set_level(logging.INFO)
+    config['artifact_path'] = ''
+    config['poll_cluster'] = True
+    config['retry_states'] = 'INTERRUPTED'
+    config['max_attempts'] = 3
+    aws_api.return_value.list_cluster_steps.return_value = \
+        [make_attempt(step_info, 's-648', 'INTERRUPTED')]
+
+    with pytest.raises(ValueError):
+        handle_job_request(config)
+
+    assert shell_function.call_count == 0
+    assert 'action=disable-retries' in caplog.text
+
+
+def test_invalid_retry_state_throws_error(config, aws_api, shell_function):
+    config['retry_states'] = 'COMPLETED'
+
+    with pytest.raises(ValueError) as excinfo:
+        handle_job_request(config)
+
+    assert str(excinfo.value) == \
+        "--retry-states should be in ['CANCELLED', 'FAILED', 'INTERRUPTED']"
@@ -0,0 +1,68 @@
+import pytz
+from datetime import datetime, timedelta
+
+from emr.job_client import cluster_step_metrics
+from emr.metrics import (bulk_step_metrics, newest_step, StepMetricsTable)
+from emr.utils import to_epoch_seconds
+
+NOW = datetime(2018, 1, 1, 1, 0, 0, 0).replace(tzinfo=pytz.utc)
+
+
+def make_step(step_id, name, state, minutes_ago):
+    return {
+        'Id': step_id,
+        'Name': name,
+        'Status': {
+            'State': state,
+            'Timeline': {
+                'CreationDateTime': NOW - timedelta(minutes=minutes_ago,
+                                                    seconds=30)
+            }
+        }
+    }
+
+
+def test_bulk_metrics_match_per_step_metrics(mocker):
+    mock_dt = mocker.patch('emr.job_client.datetime.datetime')
+    mock_dt.now.return_value = NOW
+    steps = [make_step('s-3', 'WordCount', 'RUNNING', 5),
+             make_step('s-2', 'Other', 'COMPLETED', 30),
+             make_step('s-1', 'WordCount', 'FAILED', 45)]
+
+    result = bulk_step_metrics(steps, to_epoch_seconds(NOW))
+
+    assert [r.as_dict() for r in result['steps']] == \
+        [cluster_step_metrics(s) for s in steps]
+
+
+def test_bulk_metrics_state_counts_and_newest_by_name():
+    steps = [make_step('s-2', 'Other', 'COMPLETED', 30),
+             make_step('s-3', 'WordCount', 'RUNNING', 5),
+             make_step('s-1', 'WordCount', 'COMPLETED', 45)]
+
+    result = bulk_step_metrics(steps, to_epoch_seconds(NOW))
+
+    assert result['stateCounts'] == {'COMPLETED': 2, 'RUNNING': 1}
+    assert result['newestByName']['WordCount'].id == 's-3'
+    assert result['newestByName']['WordCount'].minutes_elapsed == 5
+    assert result['newestByName']['Other'].id == 's-2'
+
+
+def test_table_columns_and_single_record():
+    table = StepMetricsTable.from_steps(
+        [make_step('s-1', 'WordCount', 'PENDING', 2)])
+
+    assert len(table) == 1
+    assert table.created[0] == to_epoch_seconds(NOW) - 150
+    record = table.record(0, to_epoch_seconds(NOW))
+    assert (record.id, record.state, record.minutes_elapsed) == \
+        ('s-1', 'PENDING', 2)
+    assert record.created_time == '2018-01-01T00-57-30'
+
+
+def test_newest_step_picks_latest_creation_time():
+    steps = [make_step('s-1', 'WordCount', 'COMPLETED', 45),
+             make_step('s-3', 'WordCount', 'RUNNING', 5),
+             make_step('s-2', 'WordCount', 'FAILED', 30)]
+
+    assert newest_step(steps)['Id'] == 's-3'
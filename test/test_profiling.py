@@ -0,0 +1,90 @@
+import json
+import os
+import pstats
+import pytest
+import pytz
+from click.testing import CliRunner
+from datetime import datetime
+
+import emr.profiling
+from emr.job_client import parse_arguments
+from emr.profiling import profile_run, span
+
+
+def read_trace(trace_path):
+    with open(trace_path) as f:
+        return json.load(f)
+
+
+def span_names(trace):
+    return [e['name'] for e in trace['traceEvents'] if e['ph'] == 'X']
+
+
+def test_span_is_a_no_op_without_a_profiled_run():
+    with span('poll-tick'):
+        pass
+
+    assert emr.profiling._tracer is None
+
+
+def test_profile_run_writes_trace_and_stats(tmpdir):
+    trace_path = str(tmpdir.join('trace.json'))
+
+    def run():
+        with span('outer', job='WordCount'):
+            with span('inner'):
+                return [0] * 1000
+
+    assert profile_run(run, trace_path) == [0] * 1000
+
+    trace = read_trace(trace_path)
+    assert span_names(trace) == ['inner', 'outer', 'run']
+    outer = [e for e in trace['traceEvents'] if e['name'] == 'outer'][0]
+    assert outer['args'] == {'job': 'WordCount'}
+    assert outer['dur'] >= 0
+    assert any(e['ph'] == 'C' for e in trace['traceEvents'])
+    assert trace['otherData']['peakTracedMemory'] > 0
+    assert pstats.Stats(trace_path + '.pstats').total_calls > 0
+    assert emr.profiling._tracer is None
+
+
+def test_profile_run_writes_trace_when_run_fails(tmpdir):
+    trace_path = str(tmpdir.join('trace.json'))
+
+    def run():
+        with span('submission'):
+            raise ValueError('StepIds not found in terminal output')
+
+    with pytest.raises(ValueError):
+        profile_run(run, trace_path)
+
+    assert span_names(read_trace(trace_path)) == ['submission', 'run']
+
+
+def test_cli_profiles_job_phases(tmpdir, mocker):
+    aws_api = mocker.patch('emr.utils.AWSApi', autospec=True)
+    aws_api.return_value.get_emr_cluster_with_name.return_value = \
+        [{'id': 'cl-359', 'name': 'Sandbox', 'state': 'RUNNING'}]
+    aws_api.return_value.list_cluster_steps.return_value = [{
+        'Id': 's-648',
+        'Name': 'WordCount',
+        'Status': {
+            'State': 'COMPLETED',
+            'Timeline': {'CreationDateTime': datetime.now(pytz.utc)}
+        }
+    }]
+    shell = mocker.patch('emr.utils.run_shell_command', autospec=True)
+    shell.return_value = '{"StepIds": ["s-648"]}'
+    mocker.patch('emr.job_client.time.sleep')
+    trace_path = str(tmpdir.join('trace.json'))
+
+    result = CliRunner().invoke(parse_arguments, [
+        '--env', 'qa', '--cluster-name', 'Sandbox', '--job-name', 'WordCount',
+        '--artifact-path', 's3://bucket/wordcount/', '--job-runtime', 'python',
+        '--poll-cluster', '--auto-terminate', '--profile-run', trace_path])
+
+    assert result.exit_code == 0
+    assert os.path.exists(trace_path + '.pstats')
+    assert span_names(read_trace(trace_path)) == [
+        'client-creation', 'cluster-resolution', 'template-render',
+        'submission', 'poll-sleep', 'poll-tick', 'termination', 'run']
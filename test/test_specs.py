@@ -0,0 +1,175 @@
+import os
+import pytest
+import textwrap
+from click.testing import CliRunner
+
+import emr.specs
+from emr.job_client import parse_arguments
+from emr.specs import apply_job_spec, compile_specs, JobSpec, load_job_specs
+
+SPEC_FILE = textwrap.dedent('''
+    defaults:
+        job_runtime: scala
+        job_timeout: 60
+        poll_cluster: true
+    envs:
+        qa:
+            profile: qa
+        prod:
+            profile: prod
+            job_timeout: 120
+    clusters:
+        Sandbox:
+            terminate: false
+    jobs:
+        SparkBase:
+            job_configs: --conf spark.executor.memory=4g
+        WordCount:
+            extends: SparkBase
+            job_runtime: java
+            main_class: org.apache.spark.examples.WordCount
+            artifact_path: s3://bucket/wordcount.jar
+''')
+
+
+@pytest.fixture(autouse=True)
+def clear_compiled_specs():
+    os.environ['JOB_SPEC'] = ''
+    emr.specs._compiled_specs.clear()
+
+
+@pytest.fixture
+def spec_path(tmpdir):
+    path = tmpdir.join('jobs.yml')
+    path.write(SPEC_FILE)
+    return str(path)
+
+
+def test_resolves_spec_with_inheritance(spec_path):
+    spec = load_job_specs(spec_path).resolve('prod', 'Sandbox', 'WordCount')
+
+    assert spec == JobSpec(
+        profile='prod',
+        job_runtime='java',
+        job_timeout=120,
+        artifact_path='s3://bucket/wordcount.jar',
+        poll_cluster=True,
+        terminate=False,
+        job_configs='--conf spark.executor.memory=4g',
+        main_class='org.apache.spark.examples.WordCount')
+
+
+def test_unknown_job_raises_error(spec_path):
+    with pytest.raises(ValueError) as excinfo:
+        load_job_specs(spec_path).resolve('qa', 'Sandbox', 'Missing')
+
+    assert str(excinfo.value) == 'Job Missing not found in job specs'
+
+
+@pytest.mark.parametrize('raw_specs, error', [
+    ({'steps': {}}, "Unknown job spec sections ['steps']"),
+    ({'jobs': {'A': {'cluster': 'x'}}}, "Unknown keys ['cluster']"),
+    ({'envs': {'qa': {'job_runtime': 'go'}}}, 'job_runtime in job spec'),
+    ({'defaults': {'job_timeout': '60'}}, 'should be an integer'),
+    ({'defaults': {'job_timeout': True}}, 'should be an integer'),
+    ({'jobs': {'A': {'extends': 'B'}}}, 'Job A extends undefined job B'),
+    ({'jobs': {'A': {'extends': 'B'}, 'B': {'extends': 'A'}}},
+     'Circular job spec inheritance'),
+])
+def test_invalid_specs_raise_error(raw_specs, error):
+    with pytest.raises(ValueError) as excinfo:
+        compile_specs(raw_specs)
+
+    assert error in str(excinfo.value)
+
+
+def test_reuses_file_cache_until_spec_changes(spec_path, mocker):
+    load_job_specs(spec_path)
+    assert os.path.exists(spec_path + '.cache')
+
+    # a new process reads the pickled specs without parsing yaml
+    emr.specs._compiled_specs.clear()
+    load_config = mocker.patch('emr.utils.load_config')
+    specs = load_job_specs(spec_path)
+    assert not load_config.called
+    assert specs.resolve('qa', 'Sandbox', 'WordCount').profile == 'qa'
+
+    # modifying the spec file invalidates the cache
+    mocker.stopall()
+    with open(spec_path, 'a') as f:
+        f.write('        job_timeout: 30\n')
+    specs = load_job_specs(spec_path)
+    assert specs.resolve('qa', 'Sandbox', 'WordCount').job_timeout == 30
+
+
+def test_malformed_spec_file_raises_error(tmpdir):
+    path = tmpdir.join('jobs.yml')
+    path.write('jobs: [WordCount\n')
+
+    with pytest.raises(ValueError) as excinfo:
+        load_job_specs(str(path))
+
+    assert 'Job spec file is not valid YAML: {}'.format(path) in \
+        str(excinfo.value)
+
+
+def test_missing_spec_file_raises_error(tmpdir):
+    with pytest.raises(ValueError) as excinfo:
+        load_job_specs(str(tmpdir.join('missing.yml')))
+
+    assert 'Job spec file not found' in str(excinfo.value)
+
+
+def test_explicit_params_take_precedence_over_spec():
+    params = {'profile': 'dev', 'job_timeout': 60, 'main_class': None}
+    spec = JobSpec(profile='qa', job_timeout=30, main_class='WordCount')
+
+    merged = apply_job_spec(params, spec, set(['profile']))
+
+    assert merged == \
+        {'profile': 'dev', 'job_timeout': 30, 'main_class': 'WordCount'}
+
+
+def test_cli_applies_job_spec(spec_path, mocker):
+    handle_job_request = \
+        mocker.patch('emr.job_client.handle_job_request', autospec=True)
+
+    result = CliRunner().invoke(parse_arguments, [
+        '--env', 'qa', '--cluster-name', 'Sandbox', '--job-name', 'WordCount',
+        '--job-timeout', '10', '--job-spec', spec_path])
+
+    assert result.exit_code == 0
+    params = handle_job_request.call_args[0][0]
+    assert params['profile'] == 'qa'
+    assert params['job_runtime'] == 'java'
+    assert params['poll_cluster'] is True
+    assert params['job_timeout'] == 10
+
+
+def test_loads_spec_relative_to_working_directory(spec_path, tmpdir):
+    with tmpdir.as_cwd():
+        spec = load_job_specs('jobs.yml').resolve('qa', 'Sandbox', 'WordCount')
+
+    assert spec.profile == 'qa'
+
+
+def test_explicit_spec_path_takes_precedence_over_env(spec_path, tmpdir):
+    os.environ['JOB_SPEC'] = str(tmpdir.join('missing.yml'))
+
+    specs = load_job_specs(spec_path)
+
+    assert specs.resolve('qa', 'Sandbox', 'WordCount').profile == 'qa'
+
+
+def test_cli_applies_job_spec_from_env(spec_path, mocker):
+    handle_job_request = \
+        mocker.patch('emr.job_client.handle_job_request', autospec=True)
+
+    result = CliRunner().invoke(parse_arguments, [
+        '--env', 'qa', '--cluster-name', 'Sandbox', '--job-name', 'WordCount'],
+        env={'JOB_SPEC': spec_path})
+
+    assert result.exit_code == 0
+    params = handle_job_request.call_args[0][0]
+    assert params['profile'] == 'qa'
+    assert params['job_runtime'] == 'java'
@@ -0,0 +1,66 @@
+import json
+import pytest
+from six.moves.urllib.error import HTTPError
+from six.moves.urllib.request import urlopen
+
+from emr.status import PollStatus, StatusServer
+
+
+@pytest.fixture
+def status():
+    return PollStatus('qa', 'Sandbox', 'WordCount', 'cl-359')
+
+
+@pytest.fixture
+def server(status):
+    status_server = StatusServer(status, 0)
+    status_server.start()
+    yield status_server
+    status_server.stop()
+
+
+def get_json(server, path):
+    url = 'http://127.0.0.1:{}{}'.format(server.port, path)
+    return json.loads(urlopen(url, timeout=5).read().decode('utf-8'))
+
+
+def test_snapshot_before_first_poll(status):
+    snapshot = status.snapshot()
+
+    assert snapshot['job'] == 'WordCount'
+    assert snapshot['clusterId'] == 'cl-359'
+    assert snapshot['step'] == {}
+    assert snapshot['polls'] == 0
+    assert snapshot['secondsSinceLastPoll'] is None
+    assert snapshot['apiLatencyMs'] == {'p50': None, 'p95': None, 'max': None}
+
+
+def test_snapshot_tracks_polls_and_latency(status):
+    for seconds in (0.1, 0.2, 0.3):
+        status.record_api_call(seconds)
+    status.update({'id': 's-648', 'state': 'RUNNING', 'minutesElapsed': 2.0})
+
+    snapshot = status.snapshot()
+
+    assert snapshot['step']['state'] == 'RUNNING'
+    assert snapshot['polls'] == 1
+    assert snapshot['apiCalls'] == 3
+    assert snapshot['apiLatencyMs']['p50'] == pytest.approx(200.0)
+    assert snapshot['apiLatencyMs']['max'] == pytest.approx(300.0)
+
+
+def test_server_returns_status_as_json(server, status):
+    status.update({'id': 's-648', 'state': 'PENDING', 'minutesElapsed': 0.0})
+
+    result = get_json(server, '/status')
+
+    assert result['step'] == \
+        {'id': 's-648', 'state': 'PENDING', 'minutesElapsed': 0.0}
+    assert result['polls'] == 1
+
+
+def test_server_returns_not_found_for_other_paths(server):
+    with pytest.raises(HTTPError) as excinfo:
+        get_json(server, '/steps')
+
+    assert excinfo.value.code == 404
@@ -0,0 +1,140 @@
+import pytest
+import pytz
+import threading
+import time
+from datetime import datetime
+from mock import Mock
+
+from emr.step_cache import SharedStepCache
+
+STATES = ['PENDING', 'RUNNING']
+
+
+def make_steps():
+    return [{
+        'Id': 's-648',
+        'Name': 'WordCount',
+        'Status': {
+            'State': 'RUNNING',
+            'Timeline': {
+                'CreationDateTime':
+                    datetime(2018, 1, 1, 0, 0, 0, 0).replace(tzinfo=pytz.utc)
+            }
+        }
+    }]
+
+
+def test_serves_cached_listing_within_ttl(tmpdir):
+    cache = SharedStepCache(str(tmpdir), ttl=30)
+    fetch = Mock(return_value=make_steps())
+
+    first = cache.get('cl-359', STATES, fetch)
+    second = SharedStepCache(str(tmpdir), ttl=30).get('cl-359', STATES, fetch)
+
+    assert fetch.call_count == 1
+    assert first == second == make_steps()
+
+
+def test_refreshes_listing_after_ttl(tmpdir, mocker):
+    cache = SharedStepCache(str(tmpdir), ttl=30)
+    fetch = Mock(return_value=make_steps())
+    mock_time = mocker.patch('emr.step_cache.time.time')
+
+    mock_time.return_value = 1000.0
+    cache.get('cl-359', STATES, fetch)
+    mock_time.return_value = 1029.0
+    cache.get('cl-359', STATES, fetch)
+    assert fetch.call_count == 1
+
+    mock_time.return_value = 1031.0
+    cache.get('cl-359', STATES, fetch)
+    assert fetch.call_count == 2
+
+
+def test_listings_are_keyed_by_cluster_and_states(tmpdir):
+    cache = SharedStepCache(str(tmpdir), ttl=30)
+    fetch = Mock(return_value=[])
+
+    cache.get('cl-359', STATES, fetch)
+    cache.get('cl-359', ['RUNNING', 'PENDING'], fetch)
+    cache.get('cl-359', ['RUNNING'], fetch)
+    cache.get('cl-637', STATES, fetch)
+
+    assert fetch.call_count == 3
+
+
+def test_concurrent_pollers_share_one_fetch(tmpdir):
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.2)
+        return make_steps()
+
+    results = []
+
+    def poll():
+        cache = SharedStepCache(str(tmpdir), ttl=30)
+        results.append(cache.get('cl-359', STATES, fetch))
+
+    threads = [threading.Thread(target=poll) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [make_steps()] * 8
+
+
+def test_failed_fetch_is_not_cached(tmpdir):
+    cache = SharedStepCache(str(tmpdir), ttl=30)
+    fetch = Mock(side_effect=[RuntimeError('throttled'), make_steps()])
+
+    try:
+        cache.get('cl-359', STATES, fetch)
+    except RuntimeError:
+        pass
+
+    assert cache.get('cl-359', STATES, fetch) == make_steps()
+    assert fetch.call_count == 2
+
+
+def test_pollers_create_directory_concurrently(tmpdir):
+    directory = str(tmpdir.join('steps'))
+    errors = []
+
+    def create():
+        try:
+            SharedStepCache(directory)
+        except OSError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=create) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert tmpdir.join('steps').check(dir=True)
+
+
+def test_falls_back_to_fetch_on_corrupt_cache_file(tmpdir):
+    cache = SharedStepCache(str(tmpdir))
+    cache.get('cl-359', STATES, Mock(return_value=[]))
+    for path in tmpdir.listdir():
+        path.write('not a database')
+    fetch = Mock(return_value=make_steps())
+
+    assert cache.get('cl-359', STATES, fetch) == make_steps()
+    assert fetch.call_count == 1
+
+
+def test_fetch_errors_are_not_retried(tmpdir):
+    cache = SharedStepCache(str(tmpdir))
+    fetch = Mock(side_effect=OSError('connection reset'))
+
+    with pytest.raises(OSError):
+        cache.get('cl-359', STATES, fetch)
+    assert fetch.call_count == 1
@@ -0,0 +1,294 @@
+import gzip
+import json
+import pytest
+import pytz
+from subprocess import CalledProcessError
+from datetime import datetime
+from botocore.exceptions import ClientError, EndpointConnectionError
+from mock import Mock
+
+import emr.utils
+from emr.job_client import handle_job_request
+from emr.trace import (REDACTED, TRACE_VERSION, TraceRecorder, TraceReplayer,
+                       VirtualClock, redact, shell_operation)
+
+ORIGIN = 1514764800.0
+
+
+def make_step(state, created=ORIGIN + 1):
+    return {
+        'Id': 's-648',
+        'Name': 'WordCount',
+        'Config': {'Args': ['spark-submit', '--password', 'hunter2']},
+        'Status': {
+            'State': state,
+            'Timeline': {
+                'CreationDateTime':
+                    datetime.fromtimestamp(created, pytz.utc)
+            }
+        }
+    }
+
+
+def write_trace(path, events):
+    with gzip.open(path, 'wt') as f:
+        f.write(json.dumps({'version': TRACE_VERSION, 'origin': ORIGIN}))
+        f.write('\n')
+        for event in events:
+            event.setdefault('params', {})
+            event.setdefault('duration', 0.5)
+            f.write(json.dumps(event, default=emr.utils.json_default))
+            f.write('\n')
+    return str(path)
+
+
+def read_trace(path):
+    with gzip.open(path, 'rt') as f:
+        return [json.loads(line, object_hook=emr.utils.json_object_hook)
+                for line in f]
+
+
+@pytest.fixture
+def incident_trace(tmpdir):
+    return write_trace(tmpdir.join('incident.trace.gz'), [
+        {'service': 'emr', 'operation': 'list_clusters', 'start': 0,
+         'response': {'Clusters': [{'Id': 'cl-359', 'Name': 'Sandbox',
+                                    'Status': {'State': 'RUNNING'}}]}},
+        {'service': 'shell', 'operation': 'aws emr add-steps', 'start': 1,
+         'duration': 2, 'response': '{"StepIds": ["s-648"]}'},
+        {'service': 'emr', 'operation': 'list_steps', 'start': 5,
+         'response': {'Steps': [make_step('RUNNING')]}},
+        {'service': 'emr', 'operation': 'list_steps', 'start': 300,
+         'response': {'Steps': [make_step('COMPLETED')]}}
+    ])
+
+
+def test_redacts_sensitive_keys():
+    response = {
+        'Steps': [{'Id': 's-648', 'Config': {'Args': ['--key', 'abc']}}],
+        'SessionToken': 'abc',
+        'ResponseMetadata': {'RequestId': '123'}
+    }
+
+    assert redact(response) == {
+        'Steps': [{'Id': 's-648', 'Config': {'Args': REDACTED}}],
+        'SessionToken': REDACTED
+    }
+    assert response['SessionToken'] == 'abc'
+
+
+def test_records_redacted_calls(tmpdir, mocker):
+    mocker.patch('emr.trace.time.time', return_value=100.0)
+    path = str(tmpdir.join('run.trace.gz'))
+    aws_api = Mock(spec=['emr', 's3', 'run_command'])
+    aws_api.emr.list_steps.return_value = {
+        'Steps': [make_step('RUNNING')],
+        'ResponseMetadata': {'RequestId': '123'}
+    }
+
+    recorder = TraceRecorder(path)
+    recorder.wrap_api(aws_api)
+    mocker.patch('emr.trace.time.time', side_effect=[101.0, 101.25])
+    steps = aws_api.emr.list_steps(ClusterId='cl-359')
+    recorder.close()
+
+    assert steps['Steps'][0]['Config']['Args'][-1] == 'hunter2'
+    header, event = read_trace(path)
+    assert header == {'version': TRACE_VERSION, 'origin': 100.0}
+    assert event == {
+        'service': 'emr',
+        'operation': 'list_steps',
+        'params': {'ClusterId': 'cl-359'},
+        'start': 1.0,
+        'duration': 0.25,
+        'response': {'Steps': [redact(make_step('RUNNING'))]}
+    }
+
+
+def test_records_shell_command_without_arguments(tmpdir, mocker):
+    mocker.patch('emr.utils.run_shell_command',
+                 return_value=b'{"StepIds": ["s-648"]}')
+    path = str(tmpdir.join('run.trace.gz'))
+
+    recorder = TraceRecorder(path)
+    output = recorder.run_shell_command(
+        'aws emr add-steps --profile qa --steps Args=secret')
+    recorder.close()
+
+    assert output == b'{"StepIds": ["s-648"]}'
+    event = read_trace(path)[1]
+    assert event['operation'] == 'aws emr add-steps'
+    assert event['response'] == '{"StepIds": ["s-648"]}'
+
+
+@pytest.mark.parametrize('cmd', [
+    'aws emr terminate-clusters --cluster-id cl-359',
+    'aws emr --profile qa terminate-clusters --cluster-id cl-359',
+    'aws emr --profile=qa terminate-clusters --cluster-id cl-359'
+])
+def test_names_shell_commands_by_subcommand(cmd):
+    assert shell_operation(cmd) == 'aws emr terminate-clusters'
+
+
+def test_replays_shell_command_recorded_without_profile(incident_trace):
+    replayer = TraceReplayer(incident_trace)
+
+    output = replayer.aws_api().run_command(
+        'aws emr --profile prod add-steps --cluster-id cl-359')
+
+    assert output == '{"StepIds": ["s-648"]}'
+
+
+def test_recording_a_replay_never_runs_aws_cli(tmpdir, mocker):
+    run_shell_command = mocker.patch('emr.utils.run_shell_command')
+    path = write_trace(tmpdir.join('incident.trace.gz'), [
+        {'service': 'emr', 'operation': 'list_clusters', 'start': 0,
+         'response': {'Clusters': [{'Id': 'cl-359', 'Name': 'Sandbox',
+                                    'Status': {'State': 'RUNNING'}}]}},
+        {'service': 'shell', 'operation': 'aws emr terminate-clusters',
+         'start': 1, 'response': ''}
+    ])
+    aws_api = TraceReplayer(path).aws_api()
+    recorder = TraceRecorder(str(tmpdir.join('rerun.trace.gz')))
+    recorder.wrap_api(aws_api)
+
+    aws_api.terminate_clusters('Sandbox', {'profile': 'qa'})
+    recorder.close()
+
+    run_shell_command.assert_not_called()
+    assert [e.get('operation') for e in read_trace(recorder.trace_path)] == \
+        [None, 'list_clusters', 'aws emr terminate-clusters']
+
+
+def test_replays_latest_response_at_virtual_time(incident_trace):
+    replayer = TraceReplayer(incident_trace)
+    aws_api = replayer.aws_api()
+
+    assert aws_api.list_cluster_steps('cl-359')[0]['Status']['State'] == \
+        'RUNNING'
+    replayer.clock.sleep(300)
+    steps = aws_api.list_cluster_steps('cl-359')
+
+    assert steps[0]['Status']['State'] == 'COMPLETED'
+    assert steps[0]['Status']['Timeline']['CreationDateTime'] == \
+        datetime.fromtimestamp(ORIGIN + 1, pytz.utc)
+    assert replayer.clock.offset == 301
+    assert replayer.calls[('emr', 'list_steps')] == 2
+
+
+def test_replays_matching_request_parameters(tmpdir):
+    path = write_trace(tmpdir.join('pages.trace.gz'), [
+        {'service': 'emr', 'operation': 'list_steps', 'start': 0,
+         'params': {'ClusterId': 'cl-359', 'StepStates': ['COMPLETED']},
+         'response': {'Steps': [make_step('COMPLETED')], 'Marker': 'p2'}},
+        {'service': 'emr', 'operation': 'list_steps', 'start': 0.5,
+         'params': {'ClusterId': 'cl-359', 'StepStates': ['COMPLETED'],
+                    'Marker': 'p2'},
+         'response': {'Steps': [make_step('COMPLETED', ORIGIN - 60)]}}
+    ])
+    aws_api = TraceReplayer(path).aws_api()
+
+    steps = list(aws_api.iter_cluster_steps('cl-359', ['COMPLETED']))
+
+    assert len(steps) == 2
+
+
+def test_replays_recorded_errors(tmpdir):
+    path = write_trace(tmpdir.join('throttled.trace.gz'), [
+        {'service': 'emr', 'operation': 'list_steps', 'start': 0,
+         'error': {'Error': {'Code': 'ThrottlingException',
+                             'Message': 'Rate exceeded'}}}
+    ])
+    aws_api = TraceReplayer(path).aws_api()
+
+    with pytest.raises(ClientError) as e:
+        aws_api.list_cluster_steps('cl-359')
+    assert e.value.response['Error']['Code'] == 'ThrottlingException'
+
+
+def test_replays_recorded_exceptions(tmpdir, mocker):
+    mocker.patch('emr.utils.run_shell_command', side_effect=CalledProcessError(
+        255, 'aws emr add-steps --steps Args=secret'))
+    path = str(tmpdir.join('outage.trace.gz'))
+    aws_api = Mock(spec=['emr', 's3', 'run_command'])
+    aws_api.run_command = emr.utils.run_shell_command
+    aws_api.emr.list_steps.side_effect = \
+        EndpointConnectionError(endpoint_url='https://emr')
+    recorder = TraceRecorder(path)
+    recorder.wrap_api(aws_api)
+
+    with pytest.raises(EndpointConnectionError):
+        aws_api.emr.list_steps(ClusterId='cl-359')
+    with pytest.raises(CalledProcessError):
+        aws_api.run_command('aws emr add-steps --steps Args=secret')
+    recorder.close()
+    replayed = TraceReplayer(path).aws_api()
+
+    with pytest.raises(EndpointConnectionError) as e:
+        replayed.list_cluster_steps('cl-359')
+    assert 'https://emr' in str(e.value)
+    with pytest.raises(CalledProcessError) as e:
+        replayed.run_command('aws emr add-steps --steps Args=other')
+    assert e.value.returncode == 255
+    assert 'secret' not in gzip.open(path, 'rt').read()
+
+
+def test_unrecorded_operation_throws_error(incident_trace):
+    aws_api = TraceReplayer(incident_trace).aws_api()
+
+    with pytest.raises(ValueError):
+        aws_api.list_running_cluster_instances('cl-359')
+
+
+def test_virtual_clock_compresses_sleeps(mocker):
+    time_sleep = mocker.patch('emr.trace.time.sleep')
+    clock = VirtualClock(ORIGIN, speed=60)
+
+    clock.sleep(120)
+
+    time_sleep.assert_called_once_with(2.0)
+    assert clock.now() == datetime.fromtimestamp(ORIGIN + 120, pytz.utc)
+
+
+def test_replays_job_request_on_virtual_clock(incident_trace, mocker):
+    time_sleep = mocker.patch('emr.job_client.time.sleep')
+    config = {
+        'artifact_path': 's3://us-east-1.elasticmapreduce/samples/wordcount/',
+        'cluster_name': 'Sandbox',
+        'dryrun': False,
+        'env': 'qa',
+        'job_name': 'WordCount',
+        'job_runtime': 'Python',
+        'job_timeout': 60,
+        'poll_cluster': True,
+        'profile': 'qa',
+        'terminate': False,
+        'replay_trace': incident_trace
+    }
+
+    cli_cmd = handle_job_request(config)
+
+    assert 'add-steps' in cli_cmd
+    time_sleep.assert_not_called()
+
+
+def test_replayed_job_request_times_out_on_virtual_clock(incident_trace,
+                                                         mocker):
+    mocker.patch('emr.job_client.time.sleep')
+    config = {
+        'artifact_path': '',
+        'cluster_name': 'Sandbox',
+        'dryrun': False,
+        'env': 'qa',
+        'job_name': 'WordCount',
+        'job_runtime': 'Python',
+        'job_timeout': 3,
+        'poll_cluster': True,
+        'profile': 'qa',
+        'terminate': False,
+        'replay_trace': incident_trace
+    }
+
+    with pytest.raises(ValueError) as e:
+        handle_job_request(config)
+    assert 'Job exceeded timeout 3' in str(e.value)
@@ -1,9 +1,13 @@
+import json
 import os
 import pytest
+import pytz
+from datetime import datetime
 from mock import call, Mock
 from os.path import dirname, join
 
-from emr.utils import load_config, AWSApi
+from emr.utils import (load_config, AWSApi, json_default,
+                       json_object_hook)
 
 EXPECTED_LOG_HANDLERS = {
     'console': {
@@ -114,3 +118,54 @@ def test_load_failure_returns_empty_config():
     assert isinstance(result, dict)
     assert 'handlers' not in result
     assert result == {}
+
+
+def test_iterates_cluster_steps_across_pages(session):
+    aws_api = AWSApi()
+    aws_api.emr.list_steps.side_effect = [
+        {'Steps': [{'Id': 's-3'}, {'Id': 's-2'}], 'Marker': 'page-2'},
+        {'Steps': [{'Id': 's-1'}]}
+    ]
+
+    steps = [s['Id'] for s in aws_api.iter_cluster_steps('359', ['RUNNING'])]
+
+    assert steps == ['s-3', 's-2', 's-1']
+    aws_api.emr.list_steps.assert_has_calls([
+        call(ClusterId='359', StepStates=['RUNNING']),
+        call(ClusterId='359', StepStates=['RUNNING'], Marker='page-2')
+    ])
+
+
+def test_list_cluster_steps_uses_shared_cache(session):
+    aws_api = AWSApi()
+    aws_api.step_cache = Mock()
+    aws_api.step_cache.get.return_value = \
+        [{'Name': 'WordCount'}, {'Name': 'Other'}]
+
+    steps = aws_api.list_cluster_steps('359', 'WordCount', active_only=True)
+
+    assert steps == [{'Name': 'WordCount'}]
+    assert aws_api.step_cache.get.call_args[0][:2] == \
+        ('359', ['PENDING', 'RUNNING'])
+    assert not aws_api.emr.list_steps.called
+
+
+def test_list_cluster_steps_can_bypass_shared_cache(session):
+    aws_api = AWSApi()
+    aws_api.step_cache = Mock()
+    aws_api.emr.list_steps.return_value = {'Steps': [{'Name': 'WordCount'}]}
+
+    steps = aws_api.list_cluster_steps('359', active_only=True,
+                                       use_cache=False)
+
+    assert steps == [{'Name': 'WordCount'}]
+    assert not aws_api.step_cache.get.called
+
+
+def test_json_round_trips_datetimes():
+    created = datetime(2018, 1, 1, 0, 0, 0, 0).replace(tzinfo=pytz.utc)
+    value = {'Steps': [{'Id': 's-648', 'CreationDateTime': created}]}
+
+    encoded = json.dumps(value, default=json_default)
+
+    assert json.loads(encoded, object_hook=json_object_hook) == value
@@ -0,0 +1,166 @@
+import pytest
+import pytz
+from datetime import datetime, timedelta
+from botocore.exceptions import ClientError, EndpointConnectionError
+from mock import call, Mock
+
+from emr.watch import StepWatcher, watch_clusters
+
+
+def make_step(step_id, state, minute):
+    return {
+        'Id': step_id,
+        'Name': 'Job-{}'.format(step_id),
+        'Status': {
+            'State': state,
+            'Timeline': {
+                'CreationDateTime':
+                    datetime(2018, 1, 1, 0, 0, 0, 0).replace(
+                        tzinfo=pytz.utc) + timedelta(minutes=minute)
+            }
+        }
+    }
+
+
+class FakeCluster(object):
+    """Serves ListSteps responses from an in-memory step listing."""
+    def __init__(self, steps):
+        self.steps = steps
+        self.paged = []
+
+    def iter_cluster_steps(self, cluster_id, states=None):
+        for step in sorted(self.steps.values(), reverse=True,
+                           key=lambda s: s['Status']['Timeline']
+                           ['CreationDateTime']):
+            if states and step['Status']['State'] not in states:
+                continue
+            self.paged.append(step['Id'])
+            yield step
+
+    def list_steps(self, ClusterId, StepIds):
+        return {'Steps': [self.steps[i] for i in StepIds]}
+
+    def set_state(self, step_id, state):
+        self.steps[step_id]['Status']['State'] = state
+
+
+@pytest.fixture
+def cluster():
+    return FakeCluster(dict((s['Id'], s) for s in [
+        make_step('s-1', 'COMPLETED', 1),
+        make_step('s-2', 'RUNNING', 2),
+        make_step('s-3', 'PENDING', 3)
+    ]))
+
+
+@pytest.fixture
+def aws_api(cluster):
+    api = Mock()
+    api.iter_cluster_steps.side_effect = cluster.iter_cluster_steps
+    api.emr.list_steps.side_effect = cluster.list_steps
+    return api
+
+
+def states(changes):
+    return [(c['stepId'], c['previousState'], c['state']) for c in changes]
+
+
+def test_first_tick_reports_only_active_steps(aws_api, cluster):
+    watcher = StepWatcher(aws_api, 'cl-359')
+
+    assert states(watcher.tick()) == \
+        [('s-3', None, 'PENDING'), ('s-2', None, 'RUNNING')]
+    assert watcher.active == {'s-2': 'RUNNING', 's-3': 'PENDING'}
+
+
+def test_tick_reports_only_diffs_and_evicts_terminal_steps(aws_api, cluster):
+    watcher = StepWatcher(aws_api, 'cl-359')
+    watcher.tick()
+
+    # nothing changed
+    assert watcher.tick() == []
+
+    cluster.set_state('s-2', 'COMPLETED')
+    cluster.set_state('s-3', 'RUNNING')
+    assert sorted(states(watcher.tick())) == \
+        [('s-2', 'RUNNING', 'COMPLETED'), ('s-3', 'PENDING', 'RUNNING')]
+    assert watcher.active == {'s-3': 'RUNNING'}
+
+
+def test_tick_stops_paging_at_high_water_mark(aws_api, cluster):
+    watcher = StepWatcher(aws_api, 'cl-359')
+    watcher.tick()
+    cluster.steps['s-4'] = make_step('s-4', 'PENDING', 4)
+    cluster.steps['s-5'] = make_step('s-5', 'FAILED', 5)
+    del cluster.paged[:]
+
+    assert states(watcher.tick()) == \
+        [('s-5', None, 'FAILED'), ('s-4', None, 'PENDING')]
+
+    # s-3 is the old high-water mark; s-1 and older are never paged
+    assert cluster.paged == ['s-5', 's-4', 's-3', 's-2']
+    assert watcher.active == {'s-2': 'RUNNING', 's-3': 'PENDING',
+                              's-4': 'PENDING'}
+
+
+def test_refreshes_active_steps_in_batches(aws_api, cluster):
+    for i in range(4, 16):
+        cluster.steps['s-{}'.format(i)] = make_step('s-{}'.format(i),
+                                                    'PENDING', i)
+    watcher = StepWatcher(aws_api, 'cl-359')
+    watcher.tick()
+    aws_api.emr.list_steps.reset_mock()
+
+    watcher.tick()
+
+    assert aws_api.emr.list_steps.call_count == 2
+    batch_sizes = [len(c[1]['StepIds'])
+                   for c in aws_api.emr.list_steps.call_args_list]
+    assert sorted(batch_sizes) == [4, 10]
+
+
+def test_watch_clusters_sleeps_between_ticks(mocker, aws_api):
+    time_sleep = mocker.patch('emr.watch.time.sleep')
+    watcher = StepWatcher(aws_api, 'cl-359')
+
+    changes = list(watch_clusters([watcher], interval=30, max_ticks=3))
+
+    assert len(changes) == 2
+    time_sleep.assert_has_calls([call(30), call(30)])
+    assert time_sleep.call_count == 2
+
+
+def test_failed_tick_is_retried_without_losing_steps(aws_api, cluster):
+    watcher = StepWatcher(aws_api, 'cl-359')
+    watcher.tick()
+    cluster.steps['s-4'] = make_step('s-4', 'PENDING', 4)
+    cluster.set_state('s-2', 'COMPLETED')
+    throttled = []
+
+    def throttle_once(ClusterId, StepIds):
+        if not throttled:
+            throttled.append(True)
+            raise ClientError(
+                {'Error': {'Code': 'ThrottlingException'}}, 'ListSteps')
+        return cluster.list_steps(ClusterId, StepIds)
+    aws_api.emr.list_steps.side_effect = throttle_once
+
+    with pytest.raises(ClientError):
+        watcher.tick()
+    changes = watcher.tick()
+
+    assert sorted(states(changes)) == \
+        [('s-2', 'RUNNING', 'COMPLETED'), ('s-4', None, 'PENDING')]
+
+
+def test_watch_clusters_survives_aws_errors(mocker, aws_api, cluster):
+    mocker.patch('emr.watch.time.sleep')
+    failing = Mock(cluster_id='cl-404')
+    failing.tick.side_effect = [
+        EndpointConnectionError(endpoint_url='https://emr'),
+        [{'stepId': 's-9'}]]
+    watcher = StepWatcher(aws_api, 'cl-359')
+
+    changes = list(watch_clusters([failing, watcher], max_ticks=2))
+
+    assert [c['stepId'] for c in changes] == ['s-3', 's-2', 's-9']
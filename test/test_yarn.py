@@ -0,0 +1,148 @@
+import json
+import pytest
+import pytz
+import threading
+from datetime import datetime
+from mock import Mock
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+from emr.yarn import YarnProgressProbe
+
+APPS = [
+    {'id': 'application_1514764800000_0001', 'name': 'WordCount',
+     'startedTime': 1514764800000, 'state': 'FINISHED',
+     'finalStatus': 'SUCCEEDED', 'progress': 100.0, 'runningContainers': -1},
+    {'id': 'application_1514764800000_0002', 'name': 'WordCount',
+     'startedTime': 1514764860000, 'state': 'RUNNING',
+     'finalStatus': 'UNDEFINED', 'progress': 10.0, 'runningContainers': 4},
+    {'id': 'application_1514764800000_0003', 'name': 'Other',
+     'startedTime': 1514764920000, 'state': 'RUNNING',
+     'finalStatus': 'UNDEFINED', 'progress': 50.0, 'runningContainers': 2}
+]
+
+
+class ResourceManagerHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        if self.path.startswith('/ws/v1/cluster/apps?'):
+            body = {'apps': {'app': self.server.apps}}
+        else:
+            app_id = self.path.rsplit('/', 1)[-1]
+            body = {'app': [a for a in self.server.apps
+                            if a['id'] == app_id][0]}
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+@pytest.fixture
+def resource_manager():
+    server = HTTPServer(('127.0.0.1', 0), ResourceManagerHandler)
+    server.apps, server.paths = [dict(a) for a in APPS], []
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def step_info():
+    return {
+        'Id': 's-648',
+        'Name': 'WordCount',
+        'Status': {
+            'State': 'RUNNING',
+            'Timeline': {
+                'CreationDateTime':
+                    datetime(2018, 1, 1, 0, 0, 0, 0).replace(tzinfo=pytz.utc)
+            }
+        }
+    }
+
+
+def make_probe(resource_manager, aws_api=None):
+    return YarnProgressProbe(
+        aws_api or Mock(), 'cl-359', 'WordCount',
+        resource_manager='http://127.0.0.1:{}'.format(
+            resource_manager.server_address[1]))
+
+
+def test_finds_newest_application_for_step(resource_manager, step_info):
+    probe = make_probe(resource_manager)
+
+    progress = probe.poll(step_info)
+
+    assert progress == {
+        'applicationId': 'application_1514764800000_0002',
+        'state': 'RUNNING',
+        'finalStatus': 'UNDEFINED',
+        'progress': 10.0,
+        'runningContainers': 4
+    }
+    assert resource_manager.paths == [
+        '/ws/v1/cluster/apps?applicationTypes=SPARK'
+        '&startedTimeBegin=1514764800000']
+
+
+def test_polls_resolved_application_until_failure(resource_manager,
+                                                  step_info):
+    probe = make_probe(resource_manager)
+    probe.poll(step_info)
+    resource_manager.apps[1].update(
+        {'state': 'FINISHED', 'finalStatus': 'FAILED', 'progress': 100.0})
+
+    progress = probe.poll(step_info)
+
+    assert progress['finalStatus'] == 'FAILED'
+    assert resource_manager.paths[-1] == \
+        '/ws/v1/cluster/apps/application_1514764800000_0002'
+
+
+def test_returns_none_before_application_is_submitted(resource_manager,
+                                                      step_info):
+    resource_manager.apps = []
+    probe = make_probe(resource_manager)
+
+    assert probe.poll(step_info) is None
+    assert probe.application_id is None
+
+
+def test_resolves_resource_manager_from_master_instance():
+    aws_api = Mock()
+    aws_api.list_running_cluster_instances.return_value = \
+        {'Instances': [{'PrivateIpAddress': '192.168.0.1'}]}
+    probe = YarnProgressProbe(aws_api, 'cl-359', 'WordCount')
+
+    assert probe._resolve_resource_manager() == 'http://192.168.0.1:8088'
+    aws_api.list_running_cluster_instances.assert_called_once_with(
+        'cl-359', instance_group_types=['MASTER'])
+
+
+def test_resolves_resource_manager_on_instance_fleet_cluster():
+    aws_api = Mock()
+    aws_api.list_running_cluster_instances.side_effect = [
+        {'Instances': []},
+        {'Instances': [{'PrivateIpAddress': '192.168.0.1'}]}]
+    probe = YarnProgressProbe(aws_api, 'cl-359', 'WordCount')
+
+    assert probe._resolve_resource_manager() == 'http://192.168.0.1:8088'
+    aws_api.list_running_cluster_instances.assert_called_with(
+        'cl-359', instance_fleet_type='MASTER')
+
+
+def test_stops_polling_without_master_instance(step_info):
+    aws_api = Mock()
+    aws_api.list_running_cluster_instances.return_value = {'Instances': []}
+    probe = YarnProgressProbe(aws_api, 'cl-359', 'WordCount')
+
+    with pytest.raises(ValueError):
+        probe.poll(step_info)
+    assert probe.poll(step_info) is None
+    assert aws_api.list_running_cluster_instances.call_count == 2